@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+CACHE_ALIAS = "auth"
+
+
+def token_cache_key(key):
+    return f"token:{key}"
+
+
+def user_cache_key(user_id):
+    return f"user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Returns the User with its Worker, kept in the process cache
+    for AUTH_USER_CACHE_TIMEOUT seconds.
+    """
+
+    cache = caches[CACHE_ALIAS]
+    user = cache.get(user_cache_key(user_id))
+    if user is None:
+        try:
+            user = User.objects.select_related("worker").get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        cache.set(user_cache_key(user_id), user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication keeping verified tokens in the process cache.
+    Authenticated requests need no password hashing and no queries,
+    also in IsWorker checks. Deleted tokens are evicted from the cache.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[CACHE_ALIAS]
+        user_id = cache.get(token_cache_key(key))
+        if user_id is None:
+            try:
+                user_id = Token.objects.values_list("user_id", flat=True).get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed("Invalid token.")
+            cache.set(token_cache_key(key), user_id)
+
+        user = get_cached_user(user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return (user, key)
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication returning the cached User with its Worker,
+    so IsWorker and request.user.worker need no queries.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        user, auth = super().authenticate_credentials(userid, password, request)
+        return (get_cached_user(user.pk) or user, auth)
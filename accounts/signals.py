@@ -0,0 +1,25 @@
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from workers.models import Worker
+
+from .authentication import CACHE_ALIAS, token_cache_key, user_cache_key
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def revoke_token(sender, instance, **kwargs):
+    caches[CACHE_ALIAS].delete(token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    caches[CACHE_ALIAS].delete(user_cache_key(instance.pk))
+
+
+@receiver(post_save, sender=Worker)
+@receiver(post_delete, sender=Worker)
+def invalidate_worker(sender, instance, **kwargs):
+    caches[CACHE_ALIAS].delete(user_cache_key(instance.user_id))
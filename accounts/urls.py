@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = "accounts"
+
+urlpatterns = [
+    path("token/", views.TokenCreateView.as_view(), name="token_create"),
+    path("token/delete/", views.TokenDeleteView.as_view(), name="token_delete"),
+]
@@ -1,3 +1,26 @@
-from django.shortcuts import render
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .authentication import CachedTokenAuthentication
+
+
+class TokenCreateView(ObtainAuthToken):
+    """
+    Returns the API token of the User authenticated with username and password.
+    """
+
+
+class TokenDeleteView(APIView):
+    """
+    Revokes the API token used to authenticate the request.
+    """
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def delete(self, request):
+        Token.objects.filter(key=request.auth).delete()
+        return Response({"deleted": True})
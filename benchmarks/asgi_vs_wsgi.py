@@ -0,0 +1,230 @@
+"""
+Compares the WSGI and the ASGI application serving slow clients downloading
+exports while other clients create invoices, in-process and without network.
+A threaded WSGI server is simulated by a pool of worker threads, each
+handling a request until its whole response is sent.
+
+Usage:
+    python -m benchmarks.asgi_vs_wsgi [--notes 5000] [--downloads 16]
+        [--creates 40] [--threads 8] [--chunk-delay 0.005] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storage_manager_api.settings")
+
+# Chunk size of the simulated network, the slow clients wait
+# the chunk delay for every chunk.
+NETWORK_CHUNK = 65536
+
+
+def setup(notes):
+    settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "asgi.db")
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["localhost"]
+    django.setup(set_prefix=False)
+
+    from django.core.management import call_command
+    from notes.models import Note
+    from rest_framework.authtoken.models import Token
+    from workers.models import Worker
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    call_command(
+        "generate_data",
+        f"--notes={notes}",
+        "--products=1000",
+        "--locations=50",
+        "--contractors=200",
+        "--workers=5",
+        "--skip-stock",
+        stdout=io.StringIO(),
+    )
+    token = Token.objects.create(user=Worker.objects.first().user)
+    numbers = list(
+        Note.objects.filter(type="dispatch", handover_type="external").values_list(
+            "number", flat=True
+        )
+    )
+    return token.key, numbers
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def summary(latencies, downloaded, elapsed):
+    return {
+        "create_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "create_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "download_mb_per_second": round(downloaded / elapsed / 2**20, 2),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def run_wsgi(token, numbers, downloads, threads, delay):
+    """
+    Sends the downloads and the creates to the WSGI application
+    handled by the given number of threads.
+    """
+
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+
+    def request(method, path):
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_AUTHORIZATION": f"Token {token}",
+            "CONTENT_LENGTH": "0",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": io.StringIO(),
+        }
+        statuses = []
+        body = application(environ, lambda status, headers: statuses.append(status))
+        size = 0
+        for chunk in body:
+            size += len(chunk)
+            if method == "GET":
+                time.sleep(delay * math.ceil(len(chunk) / NETWORK_CHUNK))
+        body.close()
+        assert statuses[0].startswith("20"), (path, statuses[0])
+        return size
+
+    start = time.perf_counter()
+    latencies = []
+    with ThreadPoolExecutor(threads) as pool:
+        exports = [
+            pool.submit(request, "GET", "/bills/export/") for _ in range(downloads)
+        ]
+        # One client creating invoices one after another, waiting
+        # for a free thread like it would for a server.
+        for number in numbers:
+            sent = time.perf_counter()
+            pool.submit(request, "POST", f"/bills/invoices/create/{number}/7/").result()
+            latencies.append(time.perf_counter() - sent)
+        downloaded = sum(future.result() for future in exports)
+    return summary(latencies, downloaded, time.perf_counter() - start)
+
+
+def run_asgi(token, numbers, downloads, delay):
+    """Sends the downloads and the creates concurrently to the ASGI application."""
+
+    from storage_manager_api.asgi import application
+
+    async def request(method, path):
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"authorization", f"Token {token}".encode()),
+            ],
+            "server": ("localhost", 80),
+            "client": ("127.0.0.1", 12345),
+        }
+        sizes, statuses = [], []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+                return
+            sizes.append(len(message.get("body", b"")))
+            if method == "GET":
+                await asyncio.sleep(delay)
+
+        await application(scope, receive, send)
+        assert 200 <= statuses[0] < 300, (path, statuses[0])
+        return sum(sizes)
+
+    async def create(number):
+        start = time.perf_counter()
+        await request("POST", f"/bills/invoices/create/{number}/7/")
+        return time.perf_counter() - start
+
+    async def main():
+        exports = [
+            asyncio.create_task(request("GET", "/bills/export/"))
+            for _ in range(downloads)
+        ]
+        latencies = [await create(number) for number in numbers]
+        return latencies, sum(await asyncio.gather(*exports))
+
+    start = time.perf_counter()
+    latencies, downloaded = asyncio.run(main())
+    return summary(latencies, downloaded, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--downloads", type=int, default=16)
+    parser.add_argument("--creates", type=int, default=40)
+    parser.add_argument(
+        "--threads", type=int, default=8, help="Threads of the WSGI server."
+    )
+    parser.add_argument(
+        "--chunk-delay",
+        type=float,
+        default=0.005,
+        help="Seconds slow clients take to receive 64 KiB.",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    token, numbers = setup(args.notes)
+    if len(numbers) < 2 * args.creates:
+        raise SystemExit("Dataset too small for the number of creates.")
+    results = {
+        "wsgi": run_wsgi(
+            token,
+            numbers[: args.creates],
+            args.downloads,
+            args.threads,
+            args.chunk_delay,
+        ),
+        "asgi": run_asgi(
+            token,
+            numbers[args.creates : 2 * args.creates],
+            args.downloads,
+            args.chunk_delay,
+        ),
+    }
+    for name, metrics in results.items():
+        print(
+            f"{name}: create p50 {metrics['create_p50_ms']} ms, "
+            f"p99 {metrics['create_p99_ms']} ms, "
+            f"downloads {metrics['download_mb_per_second']} MiB/s, "
+            f"{metrics['elapsed_s']} s"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
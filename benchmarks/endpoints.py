@@ -0,0 +1,374 @@
+"""
+Runs the endpoints of bills/urls.py in-process against generated datasets
+of increasing size and records latency percentiles, SQL query counts,
+rows per second and peak memory.
+
+Usage:
+    python -m benchmarks.endpoints [--sizes 2000,20000] [--requests 20]
+        [--output results.json]
+    python -m benchmarks.endpoints --compare baseline.json results.json
+        [--threshold 0.2]
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+
+import django
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storage_manager_api.settings")
+
+# Metrics which get worse when they grow; rows_per_second gets worse
+# when it drops.
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "queries", "peak_memory_kb")
+HIGHER_IS_BETTER = ("rows_per_second",)
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of the values, None without values."""
+
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def setup():
+    settings.DATABASES["default"]["NAME"] = os.path.join(
+        tempfile.mkdtemp(), "endpoints.db"
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+
+def grow_dataset(notes, seed):
+    """
+    Adds generated Notes and bills for a third of new external dispatch
+    Notes, the rest being left for the create endpoints.
+    """
+
+    from bills.batch import create_bills
+    from django.core.management import call_command
+    from notes.models import Note
+    from workers.models import Worker
+
+    first = Note.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    call_command(
+        "generate_data",
+        f"--notes={notes}",
+        "--products=1000",
+        "--locations=50",
+        "--contractors=200",
+        "--workers=5",
+        f"--seed={seed}",
+        "--skip-stock",
+        stdout=io.StringIO(),
+    )
+    numbers = list(
+        Note.objects.filter(
+            id__gt=first, type="dispatch", handover_type="external"
+        ).values_list("number", flat=True)
+    )
+    worker = Worker.objects.first()
+    billed = numbers[: len(numbers) // 3]
+    bills = ("receipt", "invoice", "advance_invoice")
+    items = [
+        {
+            "note_number": number,
+            "bill": bills[i % 3],
+            "supply_time": 7,
+            "advance_value": "10.00",
+        }
+        for i, number in enumerate(billed)
+    ]
+    for start in range(0, len(items), 500):
+        create_bills(items[start : start + 500], worker)
+
+
+def scenarios(requests):
+    """
+    Returns (name, method, urls, data) of every benchmarked endpoint.
+    Write endpoints get Notes of their own, so every request does work.
+    """
+
+    from bills.models import AdvanceInvoice, Invoice, Receipt
+    from notes.models import Note
+
+    def billed(model):
+        return list(
+            model.objects.order_by("?").values_list("note__number", flat=True)[
+                :requests
+            ]
+        )
+
+    free = iter(
+        Note.objects.filter(
+            type="dispatch",
+            handover_type="external",
+            receipt__isnull=True,
+            invoice__isnull=True,
+            advance_invoice__isnull=True,
+        )
+        .order_by("-id")
+        .values_list("number", flat=True)
+    )
+
+    def take(count):
+        numbers = list(islice(free, count))
+        if len(numbers) < count:
+            raise SystemExit("Dataset too small for the number of requests.")
+        return numbers
+
+    receipts, invoices, adv_invoices = take(requests), take(requests), take(requests)
+    batches = [take(5) for _ in range(requests)]
+    return [
+        ("receipt_list", "get", ["/bills/receipts/"] * requests, None),
+        ("invoice_list", "get", ["/bills/invoices/"] * requests, None),
+        ("adv_invoice_list", "get", ["/bills/adv_invoices/"] * requests, None),
+        (
+            "receipt_detail",
+            "get",
+            [f"/bills/receipts/{number}/" for number in billed(Receipt)],
+            None,
+        ),
+        (
+            "invoice_detail",
+            "get",
+            [f"/bills/invoices/{number}/" for number in billed(Invoice)],
+            None,
+        ),
+        (
+            "adv_invoice_detail",
+            "get",
+            [f"/bills/adv_invoices/{number}/" for number in billed(AdvanceInvoice)],
+            None,
+        ),
+        (
+            "receipt_create",
+            "post",
+            [f"/bills/receipts/create/{number}/" for number in receipts],
+            None,
+        ),
+        (
+            "invoice_create",
+            "post",
+            [f"/bills/invoices/create/{number}/7/" for number in invoices],
+            None,
+        ),
+        (
+            "adv_invoice_create",
+            "post",
+            [
+                f"/bills/adv_invoices/create/{number}/7/10.00/"
+                for number in adv_invoices
+            ],
+            None,
+        ),
+        (
+            "batch_create",
+            "post",
+            ["/bills/batch/create/"] * requests,
+            [
+                [{"note_number": number, "bill": "receipt"} for number in batch]
+                for batch in batches
+            ],
+        ),
+        (
+            "invoice_update",
+            "put",
+            [f"/bills/invoices/update/{number}/3/executed/" for number in invoices],
+            None,
+        ),
+        (
+            "adv_invoice_update",
+            "put",
+            [
+                f"/bills/adv_invoices/update/{number}/3/executed/20.00/"
+                for number in adv_invoices
+            ],
+            None,
+        ),
+        (
+            "receipt_delete",
+            "delete",
+            [f"/bills/receipts/delete/{number}/" for number in receipts],
+            None,
+        ),
+        (
+            "invoice_delete",
+            "delete",
+            [f"/bills/invoices/delete/{number}/" for number in invoices],
+            None,
+        ),
+        (
+            "adv_invoice_delete",
+            "delete",
+            [f"/bills/adv_invoices/delete/{number}/" for number in adv_invoices],
+            None,
+        ),
+        ("export_list", "get", ["/bills/export/"] * max(requests // 10, 2), None),
+        (
+            "export_detail",
+            "get",
+            [f"/bills/export/{number}/" for number in billed(Receipt)],
+            None,
+        ),
+    ]
+
+
+def count_rows(response, content):
+    """Returns the number of rows returned or written by the request."""
+
+    if response.streaming:
+        return max(content.count(b"\n") - 1, 0)
+    data = response.data
+    if isinstance(data, dict) and "results" in data:
+        return len(data["results"])
+    return 1
+
+
+def request(client, method, url, data):
+    response = getattr(client, method)(url, data, format="json")
+    content = b"".join(response.streaming_content) if response.streaming else b""
+    assert response.status_code < 400, (url, response.status_code)
+    return response, content
+
+
+def run(client, method, urls, data):
+    """
+    Sends the requests and returns their metrics. The last request
+    is repeated alone with query capture and memory tracing.
+    """
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, rows = [], 0
+    payloads = data or [None] * len(urls)
+    for url, payload in zip(urls[:-1], payloads):
+        start = time.perf_counter()
+        response, content = request(client, method, url, payload)
+        latencies.append(time.perf_counter() - start)
+        rows += count_rows(response, content)
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        request(client, method, urls[-1], payloads[-1])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries": len(queries),
+        "rows_per_second": round(rows / sum(latencies), 1),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def benchmark(sizes, requests):
+    setup()
+
+    from rest_framework.test import APIClient
+    from workers.models import Worker
+
+    results, loaded = {}, 0
+    for size in sizes:
+        grow_dataset(size - loaded, seed=size)
+        loaded = size
+        client = APIClient()
+        client.force_authenticate(Worker.objects.first().user)
+        results[str(size)] = {}
+        for name, method, urls, data in scenarios(requests + 1):
+            # The last request is only traced, so timing needs two.
+            if len(urls) < 2:
+                print(f"{size:>8} {name:20} skipped, too few bills")
+                continue
+            metrics = run(client, method, urls, data)
+            results[str(size)][name] = metrics
+            print(
+                f"{size:>8} {name:20} p50 {metrics['p50_ms']:>9} ms  "
+                f"p99 {metrics['p99_ms']:>9} ms  {metrics['queries']:>4} queries  "
+                f"{metrics['rows_per_second']:>10} rows/s  "
+                f"{metrics['peak_memory_kb']:>9} KiB"
+            )
+    return {"sizes": sizes, "requests": requests, "results": results}
+
+
+def compare(baseline, current, threshold):
+    """
+    Prints metrics which got worse by more than the threshold,
+    or any increase of query counts. Returns the number of regressions.
+    """
+
+    regressions = 0
+    for size, endpoints in current["results"].items():
+        for name, metrics in endpoints.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is None:
+                continue
+            for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                old, new = base[metric], metrics[metric]
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if metric in HIGHER_IS_BETTER:
+                    change = -change
+                limit = 0 if metric == "queries" else threshold
+                if change > limit:
+                    regressions += 1
+                    print(
+                        f"REGRESSION {size:>8} {name:20} {metric:16} "
+                        f"{old} -> {new} ({change:+.0%})"
+                    )
+    print(f"{regressions} regressions above {threshold:.0%}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        default="2000,20000",
+        help="Comma separated numbers of notes of the datasets.",
+    )
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two result files instead of running the benchmark.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as baseline, open(args.compare[1]) as current:
+            regressions = compare(
+                json.load(baseline), json.load(current), args.threshold
+            )
+        sys.exit(1 if regressions else 0)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    results = benchmark(sizes, args.requests)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
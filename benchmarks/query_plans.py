@@ -0,0 +1,152 @@
+"""
+Records EXPLAIN QUERY PLAN and timings of the hot lookups on a generated
+database, before and after the indexes of Notes were added.
+
+Usage:
+    python -m benchmarks.query_plans [--notes 50000] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import django
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storage_manager_api.settings")
+settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(), "plans.db")
+django.setup()
+
+from bills.models import ExportJob, Payment, Receipt  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, models  # noqa: E402
+from notes.models import Note  # noqa: E402
+from products.models import Category, Manufacturer, Product  # noqa: E402
+
+BATCH_SIZE = 5000
+
+
+def populate(notes_count):
+    """
+    Creates Notes of random types with Receipts and Payments
+    for external dispatch Notes, and Products with codes.
+    """
+
+    random.seed(0)
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    notes = [
+        Note(
+            type=random.choice(Note.TYPE_CHOICES)[0],
+            handover_type=random.choice(Note.HANDOVER_TYPE_CHOICES)[0],
+            number=f"N-{i}",
+        )
+        for i in range(notes_count)
+    ]
+    Note.objects.bulk_create(notes, batch_size=BATCH_SIZE)
+    dispatched = Note.objects.filter(type="dispatch", handover_type="external")
+    note_ids = list(dispatched.values_list("id", flat=True))
+    Receipt.objects.bulk_create(
+        [Receipt(note_id=note_id) for note_id in note_ids], batch_size=BATCH_SIZE
+    )
+    Payment.objects.bulk_create(
+        [Payment(note_id=note_id) for note_id in note_ids], batch_size=BATCH_SIZE
+    )
+    manufacturer = Manufacturer.objects.create(name="Manufacturer")
+    category = Category.objects.create(name="Category")
+    Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Product {i}",
+                group="a",
+                code=f"P-{i}",
+                batch_number="01.2021",
+                unit="pc.",
+                purchase_price=1,
+                sales_price_net=2,
+                tax_rate=23,
+                best_before_date=date(2030, 1, 1),
+                description="",
+                manufacturer=manufacturer,
+                category=category,
+            )
+            for i in range(notes_count // 10)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    connection.cursor().execute("ANALYZE")
+    return note_ids
+
+
+def lookups(note_ids):
+    """Returns the hot lookups of the API as named querysets."""
+
+    number = Note.objects.get(id=note_ids[len(note_ids) // 2]).number
+    job = ExportJob(date_from=date.today() - timedelta(days=7), date_to=date.today())
+    return {
+        "create view note": Note.objects.filter(
+            number=number, type="dispatch", handover_type="external"
+        ),
+        "detail view bill": Receipt.objects.filter(note__number=number),
+        "export notes": Note.objects.filter(type="dispatch", handover_type="external"),
+        "export job notes": job.filter_notes(),
+        "payment of note": Payment.objects.filter(note_id=note_ids[0]),
+        "product by code": Product.objects.filter(code="P-1"),
+    }
+
+
+def measure(querysets, repeat):
+    """Returns plans and mean times in milliseconds of the querysets."""
+
+    results = {}
+    for name, queryset in querysets.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all()[:100])
+        elapsed = (time.perf_counter() - start) / repeat
+        results[name] = {"plan": queryset.explain(), "ms": round(elapsed * 1000, 3)}
+    return results
+
+
+def drop_note_indexes():
+    """Restores the Note schema without the unique and composite indexes."""
+
+    number = Note._meta.get_field("number")
+    old_number = models.CharField(max_length=20, db_index=True)
+    old_number.set_attributes_from_name("number")
+    old_number.model = Note
+    with connection.schema_editor() as editor:
+        # Remaking the table for the field recreates indexes from Meta,
+        # so they are removed afterwards.
+        editor.alter_field(Note, number, old_number)
+        for index in Note._meta.indexes:
+            editor.remove_index(Note, index)
+    connection.cursor().execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    note_ids = populate(args.notes)
+    querysets = lookups(note_ids)
+    after = measure(querysets, args.repeat)
+    drop_note_indexes()
+    before = measure(querysets, args.repeat)
+
+    for name in querysets:
+        print(f"{name}: {before[name]['ms']} ms -> {after[name]['ms']} ms")
+        print(f"  before: {before[name]['plan']}")
+        print(f"  after:  {after[name]['plan']}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"before": before, "after": after}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measures read and write throughput of SQLite with concurrent writer
+and reader threads, using the plain SQLite configuration and the
+profile from settings.DATABASES.
+
+Usage:
+    python -m benchmarks.sqlite_throughput [--writers 4] [--readers 4] [--seconds 5]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storage_manager_api.settings")
+
+PROFILES = {
+    "plain": {"ENGINE": "django.db.backends.sqlite3", "OPTIONS": {"timeout": 5}},
+    "tuned": {
+        "ENGINE": settings.DATABASES["default"]["ENGINE"],
+        "OPTIONS": settings.DATABASES["default"]["OPTIONS"],
+    },
+}
+DIRECTORY = tempfile.mkdtemp()
+for alias, profile in PROFILES.items():
+    settings.DATABASES[alias] = dict(
+        profile, NAME=os.path.join(DIRECTORY, f"{alias}.db")
+    )
+django.setup()
+
+from django.db import OperationalError, connections, transaction  # noqa: E402
+
+
+def run(profile, writers, readers, seconds):
+    """
+    Runs writer and reader threads against the database of the profile
+    and returns numbers of operations and errors per second.
+    """
+
+    with connections[profile].cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE entry (id INTEGER PRIMARY KEY, value TEXT, number INTEGER)"
+        )
+        cursor.execute("CREATE INDEX entry_number ON entry (number)")
+    counters = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(name):
+        with lock:
+            counters[name] += 1
+
+    def write():
+        connection = connections[profile]
+        number = 0
+        while not stop.is_set():
+            number += 1
+            try:
+                with transaction.atomic(using=profile):
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT COUNT(*) FROM entry WHERE number = %s", [number]
+                        )
+                        cursor.execute(
+                            "INSERT INTO entry (value, number) VALUES (%s, %s)",
+                            ["x" * 100, number],
+                        )
+                count("writes")
+            except OperationalError:
+                count("errors")
+        connection.close()
+
+    def read():
+        connection = connections[profile]
+        number = 0
+        while not stop.is_set():
+            number += 1
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT id, value FROM entry WHERE number = %s", [number % 1000]
+                    )
+                    cursor.fetchall()
+                count("reads")
+            except OperationalError:
+                count("errors")
+        connection.close()
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    [thread.start() for thread in threads]
+    time.sleep(seconds)
+    stop.set()
+    [thread.join() for thread in threads]
+    connections[profile].close()
+    return {name: round(value / seconds, 1) for name, value in counters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'profile':10}{'writes/s':>12}{'reads/s':>12}{'errors/s':>12}")
+    for profile in PROFILES:
+        results[profile] = run(profile, args.writers, args.readers, args.seconds)
+        result = results[profile]
+        print(
+            f"{profile:10}{result['writes']:>12}{result['reads']:>12}"
+            f"{result['errors']:>12}"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
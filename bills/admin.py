@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Receipt, Invoice, AdvanceInvoice
+from .models import Payment, Receipt, Invoice, AdvanceInvoice, ExportJob
 
 
 @admin.register(Receipt)
@@ -61,3 +61,20 @@ class PaymentAdmin(admin.ModelAdmin):
         "invoice",
         "advance_invoice",
     ]
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "created",
+        "state",
+        "note_type",
+        "handover_type",
+        "date_from",
+        "date_to",
+        "store",
+        "shop",
+        "compress",
+        "rows_written",
+        "total_rows",
+    ]
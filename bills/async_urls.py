@@ -0,0 +1,26 @@
+from django.urls import path
+
+from . import async_views, urls
+
+app_name = "bills"
+
+ASYNC_VIEWS = {
+    "receipt_list": async_views.receipt_list,
+    "invoice_list": async_views.invoice_list,
+    "adv_invoice_list": async_views.adv_invoice_list,
+    "receipt_detail": async_views.receipt_detail,
+    "invoice_detail": async_views.invoice_detail,
+    "adv_invoice_detail": async_views.adv_invoice_detail,
+    "export_list": async_views.export_data,
+    "export_detail": async_views.export_data,
+}
+
+# The patterns of bills.urls in the same order, with async read views.
+urlpatterns = [
+    (
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+        if pattern.name in ASYNC_VIEWS
+        else pattern
+    )
+    for pattern in urls.urlpatterns
+]
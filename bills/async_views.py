@@ -0,0 +1,61 @@
+"""
+Async versions of the read views, served by the ASGI application.
+ORM work runs in the bounded database thread pool, so slow clients
+only hold the event loop while they wait for their responses.
+"""
+
+from functools import wraps
+
+from storage_manager_api.handlers import AsyncStreamingHttpResponse
+from storage_manager_api.pool import run_in_pool
+
+from . import views
+from .exports import FIELDS, csv_chunks, export_page
+
+
+def rendered(view, request, args, kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+def pooled(view):
+    """
+    Returns an async view running the view and rendering
+    its response in the database thread pool.
+    """
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run_in_pool(rendered, view, request, args, kwargs)
+
+    return async_view
+
+
+receipt_list = pooled(views.ReceiptListView.as_view())
+invoice_list = pooled(views.InvoiceListView.as_view())
+adv_invoice_list = pooled(views.AdvanceInvoiceListView.as_view())
+receipt_detail = pooled(views.ReceiptDetailView.as_view())
+invoice_detail = pooled(views.InvoiceDetailView.as_view())
+adv_invoice_detail = pooled(views.AdvanceInvoiceDetailView.as_view())
+
+
+async def export_chunks(notes):
+    """Yields the csv export of the notes fetched page by page in the pool."""
+
+    yield "".join(csv_chunks([FIELDS]))
+    after = None
+    while True:
+        text, after = await run_in_pool(export_page, notes, after)
+        yield text
+        if after is None:
+            return
+
+
+async def export_data(request, note_number=None):
+    response = AsyncStreamingHttpResponse(
+        export_chunks(views.export_notes(note_number)), content_type="text/csv"
+    )
+    response["Content-Disposition"] = 'attachment; filename="export.csv"'
+    return response
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from notes.models import Note
+
+from .models import Payment, Receipt, Invoice, AdvanceInvoice
+
+BILL_MODELS = {
+    "receipt": Receipt,
+    "invoice": Invoice,
+    "advance_invoice": AdvanceInvoice,
+}
+
+BLOCKING_BILLS = {
+    "receipt": ("receipt", "advance_invoice"),
+    "invoice": ("invoice",),
+    "advance_invoice": ("receipt", "invoice", "advance_invoice"),
+}
+
+BILL_NAMES = {
+    "receipt": "Receipt",
+    "invoice": "Invoice",
+    "advance_invoice": "Advance invoice",
+}
+
+
+def create_bills(items, worker):
+    """
+    Creates bills and their Payments for many Notes at once.
+    Notes are validated with a single query and all rows are written
+    with bulk inserts inside one transaction. The Notes are locked
+    for the validation, so bills created concurrently are reported
+    as existing instead of breaking the inserts.
+    Returns a result for every item, in the given order.
+    """
+
+    with transaction.atomic():
+        notes = {
+            note.number: note
+            for note in Note.objects.filter(
+                number__in=[item["note_number"] for item in items],
+                type="dispatch",
+                handover_type="external",
+            )
+            .select_related("receipt", "invoice", "advance_invoice")
+            .select_for_update(of=("self",))
+        }
+        results = []
+        bills = {bill: [] for bill in BILL_MODELS}
+        seen = set()
+        for item in items:
+            number, bill = item["note_number"], item["bill"]
+            note = notes.get(number)
+            if note is None:
+                error = "Note not found"
+            elif number in seen:
+                error = "Note given more than once"
+            else:
+                error = next(
+                    (
+                        f"{BILL_NAMES[existing]} for given note has been already created"
+                        for existing in BLOCKING_BILLS[bill]
+                        if hasattr(note, existing)
+                    ),
+                    None,
+                )
+            seen.add(number)
+            if error:
+                results.append({"note_number": number, "error": error})
+                continue
+            bills[bill].append(build_bill(note, item, worker))
+            results.append({"note_number": number, "bill": bill, "created": True})
+
+        for bill, objects in bills.items():
+            if objects:
+                BILL_MODELS[bill].objects.bulk_create(objects)
+        create_payments(bills)
+    return results
+
+
+def build_bill(note, item, worker):
+    """
+    Returns an unsaved bill with values calculated as in its save method.
+    """
+
+    if item["bill"] == "receipt":
+        bill = Receipt(note=note)
+    else:
+        bill = BILL_MODELS[item["bill"]](
+            note=note,
+            worker=worker,
+            supply_date=datetime.utcnow() + timedelta(days=item["supply_time"]),
+        )
+        if item["bill"] == "advance_invoice":
+            bill.advance_value = item["advance_value"]
+    bill.calculate_values()
+    return bill
+
+
+def create_payments(bills):
+    """
+    Links created bills to Payments of their Notes,
+    adding Payments for Notes which have none yet.
+    Advance invoices always get their own Payment.
+    """
+
+    note_ids = [bill.note_id for objects in bills.values() for bill in objects]
+    if not note_ids:
+        return
+    payments = {
+        payment.note_id: payment
+        for payment in Payment.objects.filter(note_id__in=note_ids).order_by("id")
+    }
+    new_payments, updated_payments = [], []
+    for bill, objects in bills.items():
+        if not objects:
+            continue
+        bill_ids = dict(
+            BILL_MODELS[bill]
+            .objects.filter(note_id__in=[obj.note_id for obj in objects])
+            .values_list("note_id", "id")
+        )
+        for obj in objects:
+            payment = payments.get(obj.note_id)
+            if bill == "advance_invoice" or payment is None:
+                payment = Payment(
+                    note_id=obj.note_id, advance=bill == "advance_invoice"
+                )
+                new_payments.append(payment)
+            else:
+                updated_payments.append(payment)
+            setattr(payment, f"{bill}_id", bill_ids[obj.note_id])
+    Payment.objects.bulk_create(new_payments)
+    Payment.objects.bulk_update(updated_payments, ["receipt", "invoice"])
@@ -0,0 +1,259 @@
+import csv
+import gzip
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from notes.models import NotePosition
+
+FIELDS = [
+    "marketplace",
+    "country",
+    "invoice_id",
+    "transaction_id",
+    "transaction_time",
+    "transaction_type",
+    "item_name",
+    "item_type",
+    "units",
+    "marketplace_currency",
+    "sales_price",
+    "estimated_earnings",
+    "client_id",
+    "receipt_id",
+]
+
+CHUNK_SIZE = 2000
+
+EXPORT_VALUES = (
+    "note__from_store__city",
+    "note__from_shop__city",
+    "note__invoice__id",
+    "note__number",
+    "note__updated",
+    "note__type",
+    "product__name",
+    "product__category__name",
+    "product__unit",
+    "price_net",
+    "product__purchase_price",
+    "note__to_contractor_id",
+    "note__receipt__id",
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.EXPORT_WORKERS,
+    thread_name_prefix="export",
+)
+
+
+def export_positions(notes, *extra_values):
+    """
+    Returns positions of given notes with the values needed for export,
+    loaded with a single joined query.
+    """
+
+    return (
+        NotePosition.objects.filter(note__in=notes)
+        .order_by("note_id", "id")
+        .values_list(*EXPORT_VALUES, *extra_values)
+    )
+
+
+def export_row(values):
+    """Returns the csv row in the FIELDS layout of EXPORT_VALUES."""
+
+    (
+        store_city,
+        shop_city,
+        invoice_id,
+        number,
+        updated,
+        note_type,
+        name,
+        category,
+        unit,
+        price_net,
+        purchase_price,
+        contractor_id,
+        receipt_id,
+    ) = values
+    return [
+        store_city if store_city else shop_city,
+        "PL",
+        invoice_id,
+        number,
+        updated,
+        note_type,
+        name,
+        category,
+        unit,
+        "PLN",
+        price_net,
+        price_net - purchase_price,
+        contractor_id,
+        receipt_id,
+    ]
+
+
+def export_rows(notes, chunk_size=CHUNK_SIZE):
+    """
+    Yields csv rows in the FIELDS layout for positions of given notes.
+    """
+
+    for values in export_positions(notes).iterator(chunk_size=chunk_size):
+        yield export_row(values)
+
+
+def export_page(notes, after=None, page_size=CHUNK_SIZE):
+    """
+    Returns csv text of rows of up to page_size positions following
+    the (note_id, id) position and the position of the last row,
+    or None when there are no more rows. Every page is a separate query,
+    so async views fetch them in any thread of the pool.
+    """
+
+    positions = export_positions(notes, "note_id", "id")
+    if after:
+        note_id, pk = after
+        positions = positions.filter(
+            Q(note_id__gt=note_id) | Q(note_id=note_id, id__gt=pk)
+        )
+    page = list(positions[:page_size])
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(export_row(values[:-2]) for values in page)
+    last = page[-1][-2:] if len(page) == page_size else None
+    return buffer.getvalue(), last
+
+
+def csv_chunks(rows, chunk_size=CHUNK_SIZE):
+    """
+    Writes rows to csv and yields them in chunks of text,
+    flushing the first row right away.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, row in enumerate(rows):
+        writer.writerow(row)
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def submit_export_job(job):
+    """
+    Schedules the job on the export worker pool
+    once the transaction creating it is committed.
+    """
+
+    transaction.on_commit(lambda: executor.submit(run_export_job, job.id))
+
+
+def run_export_job(job_id):
+    """
+    Writes the csv file of the job to EXPORT_ROOT in chunks,
+    recording progress after each chunk.
+    """
+
+    from .models import ExportJob
+
+    close_old_connections()
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        notes = job.filter_notes()
+        ExportJob.objects.filter(pk=job.pk).update(
+            state="running",
+            total_rows=export_positions(notes).count(),
+            updated=timezone.now(),
+        )
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        path = os.path.join(settings.EXPORT_ROOT, job.filename)
+        opener = gzip.open if job.compress else open
+        rows_written = 0
+        with opener(path + ".part", "wt", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+            chunk = []
+            for row in export_rows(notes):
+                chunk.append(row)
+                if len(chunk) == CHUNK_SIZE:
+                    writer.writerows(chunk)
+                    rows_written += len(chunk)
+                    chunk = []
+                    ExportJob.objects.filter(pk=job.pk).update(
+                        rows_written=rows_written, updated=timezone.now()
+                    )
+            writer.writerows(chunk)
+            rows_written += len(chunk)
+        os.replace(path + ".part", path)
+        ExportJob.objects.filter(pk=job.pk).update(
+            state="finished",
+            rows_written=rows_written,
+            file=path,
+            updated=timezone.now(),
+        )
+    except Exception as e:
+        ExportJob.objects.filter(pk=job.pk).update(
+            state="failed", error=str(e), updated=timezone.now()
+        )
+        raise
+    finally:
+        close_old_connections()
+
+
+def file_response(path, range_header, content_type, filename, block_size=65536):
+    """
+    Returns the file as an attachment, serving a single
+    'bytes=start-end' range with 206 Partial Content if requested.
+    """
+
+    size = os.path.getsize(path)
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header or "")
+    if not match or match.groups() == ("", ""):
+        response = FileResponse(
+            open(path, "rb"),
+            as_attachment=True,
+            content_type=content_type,
+            filename=filename,
+        )
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    start, end = match.groups()
+    if start:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    else:
+        start, end = max(size - int(end), 0), size - 1
+    if start > end:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    def read_range():
+        with open(path, "rb") as file:
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = file.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    response = StreamingHttpResponse(
+        read_range(), status=206, content_type=content_type
+    )
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,51 @@
+from datetime import date
+
+from bills.overdue import delay_overdue_invoices, run_every
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves in progress Invoices and AdvanceInvoices without a paid Payment "
+        "past their maturity to the delayed state and prints a summary."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--date",
+            dest="today",
+            type=date.fromisoformat,
+            help="Day compared to maturity instead of today.",
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            help="Keep running, sweeping every given number of seconds.",
+        )
+
+    def handle(self, *args, chunk_size, today, every, **options):
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        def sweep():
+            summaries = delay_overdue_invoices(today, chunk_size)
+            for model, summary in summaries.items():
+                line = (
+                    f"{model._meta.verbose_name_plural.capitalize()}: "
+                    f"{summary['count']} delayed"
+                )
+                if summary["count"]:
+                    line += (
+                        f", {summary['value_gross']} gross, "
+                        f"oldest maturity {summary['oldest']}"
+                    )
+                self.stdout.write(line + ".")
+
+        if every is None:
+            sweep()
+            return
+        try:
+            run_every(every, sweep)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,44 @@
+from bills.statements import (
+    BATCH_SIZE,
+    StatementError,
+    import_statement,
+    parse_statement,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Marks Payments paid by transfers of a csv or MT940 bank statement "
+        "matched by note number, amount and contractor, and prints "
+        "unmatched lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "mt940"),
+            help="Format of the statement, detected from the first line by default.",
+        )
+        parser.add_argument("--encoding", default="utf-8")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, path, format, encoding, batch_size, **options):
+        def report(line):
+            self.stdout.write(
+                f"Unmatched line {line.line}: {line.date} {line.amount} "
+                f"{line.reference!r} {line.counterparty!r}"
+            )
+
+        with open(path, encoding=encoding, newline="") as lines:
+            try:
+                summary = import_statement(
+                    parse_statement(lines, format), batch_size, report
+                )
+            except StatementError as e:
+                raise CommandError(e)
+        self.stdout.write(
+            f"Imported {summary['lines']} lines: {summary['matched']} matched, "
+            f"{summary['unmatched']} unmatched, {summary['skipped']} debits skipped."
+        )
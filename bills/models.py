@@ -1,11 +1,18 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
 from django.db import models
-from notes.models import Note
+from django.utils import timezone
+from notes.models import Note, Shop, Store
 from workers.models import Worker
 
 
+def day_start(day):
+    """Returns the aware datetime at which the given day starts."""
+
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 class Receipt(models.Model):
     """
     Provides Receipt for specific Notes.
@@ -18,14 +25,20 @@ class Receipt(models.Model):
     tax_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     value_gross = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [models.Index(fields=["created", "id"])]
+
     def __str__(self):
         return f"<Receipt: {self.id}>"
 
     def save(self, *args, **kwargs):
+        self.calculate_values()
+        super().save(*args, **kwargs)
+
+    def calculate_values(self):
         self.value_net = self.note.value_net
         self.tax_value = self.note.tax_value
         self.value_gross = self.note.value_gross
-        super().save(*args, **kwargs)
 
 
 class Invoice(models.Model):
@@ -54,10 +67,20 @@ class Invoice(models.Model):
     tax_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     value_gross = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created", "id"]),
+            models.Index(fields=["state", "maturity"]),
+        ]
+
     def __str__(self):
         return f"<Invoice: {self.id}>"
 
     def save(self, *args, **kwargs):
+        self.calculate_values()
+        super().save(*args, **kwargs)
+
+    def calculate_values(self):
         if hasattr(self.note, "advance_invoice"):
             self.value_net = self.note.advance_invoice.rest_value_net
             self.tax_value = self.note.advance_invoice.rest_tax_value
@@ -66,7 +89,6 @@ class Invoice(models.Model):
             self.value_net = self.note.value_net
             self.tax_value = self.note.tax_value
             self.value_gross = self.note.value_gross
-        super().save(*args, **kwargs)
 
 
 class AdvanceInvoice(models.Model):
@@ -101,14 +123,23 @@ class AdvanceInvoice(models.Model):
     rest_tax_value = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     rest_value_gross = models.DecimalField(max_digits=10, decimal_places=2, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created", "id"]),
+            models.Index(fields=["state", "maturity"]),
+        ]
+
     def __str__(self):
         return f"<AdvanceInvoices: {self.id}>"
 
     def save(self, *args, **kwargs):
+        self.calculate_values()
+        super().save(*args, **kwargs)
+
+    def calculate_values(self):
         if self.note.value_gross:
             self.calculate_advance_values()
             self.calculate_rest_values()
-        super().save(*args, **kwargs)
 
     def calculate_advance_values(self):
         self.tax_value = (
@@ -155,3 +186,81 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"<Payment: {self.id}>"
+
+
+class ExportJob(models.Model):
+    """
+    Describes an export of bills data to a csv file,
+    written in background by the export worker pool.
+    """
+
+    STATE_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("finished", "Finished"),
+        ("failed", "Failed"),
+    )
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default="pending")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    store = models.ForeignKey(
+        Store, related_name="export_jobs", on_delete=models.CASCADE, null=True
+    )
+    shop = models.ForeignKey(
+        Shop, related_name="export_jobs", on_delete=models.CASCADE, null=True
+    )
+    note_type = models.CharField(
+        max_length=10, choices=Note.TYPE_CHOICES, default="dispatch"
+    )
+    handover_type = models.CharField(
+        max_length=10, choices=Note.HANDOVER_TYPE_CHOICES, default="external"
+    )
+    compress = models.BooleanField(default=False)
+    total_rows = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"<ExportJob: {self.id}>"
+
+    @property
+    def filename(self):
+        return f"export-{self.id}.csv" + (".gz" if self.compress else "")
+
+    @property
+    def percent(self):
+        if self.state == "finished":
+            return 100
+        if not self.total_rows:
+            return 0
+        return round(100 * self.rows_written / self.total_rows, 2)
+
+    def filter_notes(self):
+        """
+        Returns Notes matching the filters of the job.
+        Dates are compared as ranges of 'created',
+        so the (type, handover_type, created) index of Notes is used.
+        """
+
+        notes = Note.objects.filter(
+            type=self.note_type, handover_type=self.handover_type
+        )
+        if self.date_from:
+            notes = notes.filter(created__gte=day_start(self.date_from))
+        if self.date_to:
+            notes = notes.filter(
+                created__lt=day_start(self.date_to + timedelta(days=1))
+            )
+        if self.store_id:
+            notes = notes.filter(
+                models.Q(from_store_id=self.store_id)
+                | models.Q(to_store_id=self.store_id)
+            )
+        if self.shop_id:
+            notes = notes.filter(
+                models.Q(from_shop_id=self.shop_id) | models.Q(to_shop_id=self.shop_id)
+            )
+        return notes
@@ -0,0 +1,96 @@
+import logging
+import threading
+from decimal import Decimal
+
+from django.db import close_old_connections, transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from .models import AdvanceInvoice, Invoice
+
+logger = logging.getLogger(__name__)
+
+# Relations of the invoice models to their Payments.
+PAYMENTS = {
+    Invoice: "invoice_payment",
+    AdvanceInvoice: "advance_invoice_payment",
+}
+
+
+def overdue_invoices(model, today):
+    """
+    Returns in progress invoices of the model past their maturity
+    without a paid Payment, found with the (state, maturity) index.
+    """
+
+    return model.objects.filter(state="in_progress", maturity__lt=today).exclude(
+        **{f"{PAYMENTS[model]}__paid": True}
+    )
+
+
+def delay_overdue(model, today=None, chunk_size=10000):
+    """
+    Moves overdue invoices of the model to the delayed state with an UPDATE
+    per chunk, the chunks following (maturity, id) order of the index, so
+    paid invoices are not scanned again. Only the last row of a chunk
+    is loaded. Returns the number, gross value and the oldest maturity
+    of delayed invoices.
+    """
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    overdue = overdue_invoices(model, today or timezone.localdate())
+    summary = {"count": 0, "value_gross": Decimal(0), "oldest": None}
+    after = Q()
+    while True:
+        chunk = overdue.filter(after)
+        last = next(
+            iter(
+                chunk.order_by("maturity", "id").values_list("maturity", "id")[
+                    chunk_size - 1 : chunk_size
+                ]
+            ),
+            None,
+        )
+        if last:
+            chunk = chunk.filter(
+                Q(maturity__lt=last[0]) | Q(maturity=last[0], id__lte=last[1])
+            )
+        with transaction.atomic():
+            totals = chunk.aggregate(
+                value_gross=Sum("value_gross"), oldest=Min("maturity")
+            )
+            count = chunk.update(state="delayed", updated=timezone.now())
+        summary["count"] += count
+        # Sums of DecimalFields are not rounded on SQLite.
+        summary["value_gross"] += Decimal(totals["value_gross"] or 0).quantize(
+            Decimal("0.01")
+        )
+        summary["oldest"] = summary["oldest"] or totals["oldest"]
+        if last is None:
+            return summary
+        after = Q(maturity__gt=last[0]) | Q(maturity=last[0], id__gt=last[1])
+
+
+def delay_overdue_invoices(today=None, chunk_size=10000):
+    """Returns summaries of delay_overdue of Invoices and AdvanceInvoices."""
+
+    return {model: delay_overdue(model, today, chunk_size) for model in PAYMENTS}
+
+
+def run_every(interval, function, stop=None):
+    """
+    Calls the function every interval seconds until the stop Event is set.
+    Connections closed by the database while waiting are replaced before
+    every call and errors are logged, so the next call is still made.
+    """
+
+    stop = stop or threading.Event()
+    while True:
+        close_old_connections()
+        try:
+            function()
+        except Exception:
+            logger.exception("%s failed", getattr(function, "__name__", function))
+        if stop.wait(interval):
+            return
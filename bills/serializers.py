@@ -4,7 +4,7 @@ from products.models import Product
 from rest_framework import serializers
 from workers.models import Worker
 
-from .models import Receipt, Invoice, AdvanceInvoice
+from .models import Receipt, Invoice, AdvanceInvoice, ExportJob
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -105,3 +105,49 @@ class AdvanceInvoiceSerializer(serializers.ModelSerializer):
             "rest_tax_value",
             "rest_value_gross",
         ]
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    percent = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id",
+            "state",
+            "created",
+            "updated",
+            "date_from",
+            "date_to",
+            "store",
+            "shop",
+            "note_type",
+            "handover_type",
+            "compress",
+            "total_rows",
+            "rows_written",
+            "percent",
+            "error",
+        ]
+        read_only_fields = [
+            "state",
+            "total_rows",
+            "rows_written",
+            "error",
+        ]
+
+
+class BillBatchItemSerializer(serializers.Serializer):
+    note_number = serializers.CharField(max_length=20)
+    bill = serializers.ChoiceField(choices=["receipt", "invoice", "advance_invoice"])
+    supply_time = serializers.IntegerField(min_value=0, default=0)
+    advance_value = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False
+    )
+
+    def validate(self, data):
+        if data["bill"] == "advance_invoice" and "advance_value" not in data:
+            raise serializers.ValidationError(
+                {"advance_value": "This field is required for advance invoices."}
+            )
+        return data
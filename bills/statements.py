@@ -0,0 +1,237 @@
+import csv
+import re
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Payment
+
+BATCH_SIZE = 2000
+
+# Numbers of Notes, as in EXT-DIS-123, found in transfer titles.
+NOTE_NUMBER = re.compile(r"\b[A-Z]{3}-[A-Z]{3}-[A-Z0-9-]*[A-Z0-9]")
+SPACES = re.compile(r"\s+")
+
+# Amount of the :61: statement line of MT940: value date, optional entry
+# date, debit/credit mark, optional funds code and the amount.
+MT940_AMOUNT = re.compile(r"(\d{6})(?:\d{4})?(R?[CD])[A-Z]?(\d+,\d*)")
+# Subfields of structured :86: information, ?20-?29 being the transfer
+# title and ?32-?33 the name of the counterparty.
+MT940_SUBFIELD = re.compile(r"\?(\d\d)")
+
+CSV_COLUMNS = ("date", "amount", "reference", "counterparty")
+
+StatementLine = namedtuple(
+    "StatementLine", ("line", "date", "amount", "reference", "counterparty")
+)
+
+
+class StatementError(ValueError):
+    """Raised for statements which cannot be parsed."""
+
+
+def normalize(text):
+    return SPACES.sub(" ", text).strip().upper()
+
+
+def parse_amount(text):
+    try:
+        return Decimal(text.replace(" ", "").replace(",", "."))
+    except InvalidOperation:
+        raise StatementError(f"Invalid amount {text!r}")
+
+
+def parse_date(text, parse):
+    try:
+        return parse(text)
+    except ValueError:
+        raise StatementError(f"Invalid date {text!r}")
+
+
+def parse_csv(lines):
+    """
+    Yields StatementLines of a csv statement with date, amount,
+    reference and counterparty columns. Debits have negative amounts.
+    """
+
+    reader = csv.DictReader(lines)
+    missing = set(CSV_COLUMNS).difference(reader.fieldnames or ())
+    if missing:
+        raise StatementError(f"Missing columns: {', '.join(sorted(missing))}")
+    for row in reader:
+        if any(row[column] is None for column in CSV_COLUMNS):
+            raise StatementError(f"Missing values in line {reader.line_num}")
+        yield StatementLine(
+            reader.line_num,
+            parse_date(row["date"], date.fromisoformat),
+            parse_amount(row["amount"]),
+            row["reference"],
+            row["counterparty"],
+        )
+
+
+def parse_mt940(lines):
+    """
+    Yields StatementLines of :61: lines of an MT940 statement with their
+    :86: information, continued on the following lines. Debits have
+    negative amounts. Unstructured information is used as the reference.
+    """
+
+    def statement_line(line, day, amount, info):
+        text = "".join(info)
+        fields = MT940_SUBFIELD.split(text)
+        if len(fields) == 1:
+            return StatementLine(line, day, amount, text, "")
+        subfields = list(zip(fields[1::2], fields[2::2]))
+        reference = "".join(value for key, value in subfields if "20" <= key <= "29")
+        counterparty = "".join(value for key, value in subfields if key in ("32", "33"))
+        return StatementLine(line, day, amount, reference, counterparty)
+
+    pending = info = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.startswith(":"):
+            if info is not None:
+                info.append(line)
+            continue
+        tag, _, value = line[1:].partition(":")
+        if tag == "86" and pending and info is None:
+            info = [value]
+            continue
+        if pending:
+            yield statement_line(*pending, info or ())
+            pending = info = None
+        if tag == "61":
+            match = MT940_AMOUNT.match(value)
+            if not match:
+                raise StatementError(f"Invalid statement line {number}")
+            amount = parse_amount(match[3])
+            if match[2] in ("D", "RC"):
+                amount = -amount
+            day = parse_date(
+                match[1], lambda text: datetime.strptime(text, "%y%m%d").date()
+            )
+            pending = (number, day, amount)
+    if pending:
+        yield statement_line(*pending, info or ())
+
+
+def parse_statement(lines, statement_format=None):
+    """
+    Returns StatementLines of csv or MT940 lines,
+    the format being detected from the first line if not given.
+    """
+
+    lines = iter(lines)
+    first = next(lines, "")
+    if statement_format is None:
+        statement_format = "mt940" if first.startswith(":") else "csv"
+    lines = (line for chunk in ([first], lines) for line in chunk)
+    if statement_format == "mt940":
+        return parse_mt940(lines)
+    if statement_format == "csv":
+        return parse_csv(lines)
+    raise StatementError(f"Unknown format {statement_format!r}")
+
+
+def unpaid_payments(numbers):
+    """
+    Returns (id, note number, amount, contractor names) of unpaid Payments
+    of Notes with the numbers, the amount being the gross value of the bill.
+    """
+
+    return (
+        Payment.objects.filter(paid=False, note__number__in=numbers)
+        .annotate(
+            amount=Coalesce(
+                "invoice__value_gross",
+                "advance_invoice__value_gross",
+                "receipt__value_gross",
+            )
+        )
+        .filter(amount__isnull=False)
+        .order_by("id")
+        .values_list(
+            "id",
+            "note__number",
+            "amount",
+            "note__to_contractor__company_name",
+            "note__to_contractor__user__first_name",
+            "note__to_contractor__user__last_name",
+        )
+    )
+
+
+def payments_index(numbers):
+    """
+    Returns unpaid Payments of Notes with the numbers by
+    (note number, amount, contractor name). Contractors are found
+    by the company name or by the first and the last name of the user.
+    """
+
+    index = {}
+    for payment, number, amount, company, first_name, last_name in unpaid_payments(
+        numbers
+    ):
+        amount = Decimal(amount).quantize(Decimal("0.01"))
+        for name in (company, f"{first_name} {last_name}"):
+            name = normalize(name)
+            if name:
+                index.setdefault((number, amount, name), payment)
+    return index
+
+
+def find_payment(index, matched, line, numbers):
+    """Returns the first Payment of the line not matched yet, or None."""
+
+    counterparty = normalize(line.counterparty)
+    for number in numbers:
+        payment = index.get((number, line.amount, counterparty))
+        if payment is not None and payment not in matched:
+            return payment
+    return None
+
+
+def import_statement(lines, batch_size=BATCH_SIZE, unmatched=None):
+    """
+    Marks Payments paid by transfers of the StatementLines, read in batches.
+    Every batch is matched with a hash index of the unpaid Payments of its
+    Notes and the matched Payments are updated with a single query, so
+    memory is bounded by the batch size. Batches are committed one by one,
+    so other writers are not locked out for the whole import, and an import
+    stopped by an invalid line can be run again, paid Payments being
+    left out of matching. Unmatched credits are passed to the unmatched
+    callable. Returns numbers of lines, matched, unmatched and skipped
+    debit lines.
+    """
+
+    summary = {"lines": 0, "matched": 0, "unmatched": 0, "skipped": 0}
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return summary
+        summary["lines"] += len(batch)
+        credits = []
+        for line in batch:
+            if line.amount > 0:
+                credits.append((line, NOTE_NUMBER.findall(normalize(line.reference))))
+            else:
+                summary["skipped"] += 1
+        index = payments_index({number for _, numbers in credits for number in numbers})
+        matched = set()
+        for line, numbers in credits:
+            payment = find_payment(index, matched, line, numbers)
+            if payment is None:
+                summary["unmatched"] += 1
+                if unmatched:
+                    unmatched(line)
+            else:
+                matched.add(payment)
+        summary["matched"] += Payment.objects.filter(id__in=matched, paid=False).update(
+            paid=True, type="transfer", updated=timezone.now()
+        )
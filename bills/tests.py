@@ -1,9 +1,60 @@
+import csv
+import gzip
+import io
+import sqlite3
+import threading
 from datetime import date, timedelta
 from decimal import Decimal
 
 import pytest
-from bills.models import AdvanceInvoice, Invoice, Receipt
-from notes.models import Note
+from accounts.models import User
+from asgiref.sync import async_to_sync
+from bills.batch import create_bills
+from bills.exports import export_page, export_rows, run_export_job
+from bills.models import AdvanceInvoice, ExportJob, Invoice, Payment, Receipt
+from bills.overdue import overdue_invoices, run_every
+from bills.statements import parse_statement
+from bills.views import ExportData
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from monitoring.metrics import registry
+from notes.models import Note, NotePosition
+from rest_framework.authtoken.models import Token
+from storage_manager_api.asgi import application
+from storage_manager_api.routers import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter
+
+
+def create_billed_notes(count, advance=False):
+    """
+    Creates external dispatch Notes with positions and bills for them,
+    with advance invoices if advance is set.
+    """
+
+    for i in range(count):
+        note = Note(
+            type="dispatch",
+            handover_type="external",
+            number=f"EXT-DIS-BULK-{i}",
+            from_shop_id=1,
+            to_contractor_id=2,
+            worker_id=1,
+        )
+        note.save()
+        for product_id in (1, 2, 3):
+            NotePosition(
+                note=note,
+                product_id=product_id,
+                quantity=1,
+                price_net=10,
+                tax_rate=23,
+            ).save()
+        note.refresh_from_db()
+        Receipt(note=note).save()
+        if advance:
+            AdvanceInvoice(note=note, worker_id=1 + i % 2, advance_value=10).save()
+        Invoice(note=note, worker_id=1 + i % 2).save()
 
 
 @pytest.mark.django_db
@@ -143,3 +194,628 @@ class TestViews:
         response = worker_1.delete("/bills/adv_invoices/delete/EXT-DIS-1/")
         assert response.status_code == 200
         assert not AdvanceInvoice.objects.first()
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    @staticmethod
+    @pytest.mark.parametrize("count", [1, 20])
+    @pytest.mark.parametrize(
+        "url", ["/bills/receipts/", "/bills/invoices/", "/bills/adv_invoices/"]
+    )
+    def test_list_views(client, assert_query_budget, url, count):
+        create_billed_notes(count, advance=True)
+        response = assert_query_budget(client, url, 2)
+        assert len(response.data["results"]) == count
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "/bills/receipts/EXT-DIS-BULK-0/",
+            "/bills/invoices/EXT-DIS-BULK-0/",
+            "/bills/adv_invoices/EXT-DIS-BULK-0/",
+        ],
+    )
+    def test_detail_views(client, assert_query_budget, url):
+        create_billed_notes(3, advance=True)
+        response = assert_query_budget(client, url, 2)
+        assert response.data["note"]["number"] == "EXT-DIS-BULK-0"
+
+
+@pytest.mark.django_db
+class TestPagination:
+    @staticmethod
+    def test_list_view_pages(client):
+        create_billed_notes(5)
+        numbers = []
+        url = "/bills/invoices/?page_size=2"
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            assert len(response.data["results"]) <= 2
+            numbers += [row["note"]["number"] for row in response.data["results"]]
+            url = response.data["next"]
+        assert numbers == [f"EXT-DIS-BULK-{i}" for i in range(5)]
+
+    @staticmethod
+    def test_invalid_cursor(client):
+        response = client.get("/bills/invoices/?cursor=invalid")
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestExport:
+    @staticmethod
+    def test_export_view(client, django_assert_num_queries):
+        create_billed_notes(3)
+        response = client.get("/bills/export/")
+        assert response.status_code == 200
+        with django_assert_num_queries(1):
+            content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        assert rows[0][:3] == ["marketplace", "country", "invoice_id"]
+        assert len(rows) == 1 + 2 + 3 * 3
+        assert rows[1][0] == "Warsaw"
+        assert rows[1][3] == "EXT-DIS-1"
+        assert rows[1][10:12] == ["10.10", "3.10"]
+        assert rows[-1][3] == "EXT-DIS-BULK-2"
+        assert rows[-1][2] == str(Invoice.objects.get(note__number="EXT-DIS-BULK-2").id)
+
+    @staticmethod
+    def test_export_detail_view(client):
+        response = client.get("/bills/export/EXT-SUP-1/")
+        content = b"".join(response.streaming_content).decode()
+        assert len(content.splitlines()) == 1 + 4
+
+
+@pytest.mark.django_db
+class TestExportJobs:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def export_root(settings, tmp_path, monkeypatch):
+        settings.EXPORT_ROOT = tmp_path
+        # Jobs run in the transaction of the test instead of a worker
+        # thread, which closing the connection would end.
+        monkeypatch.setattr("bills.exports.close_old_connections", lambda: None)
+
+    @staticmethod
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_export_job(client, compress):
+        create_billed_notes(3)
+        response = client.post(
+            "/bills/export/jobs/", {"compress": compress, "note_type": "dispatch"}
+        )
+        assert response.status_code == 201
+        job_id = response.data["id"]
+        assert response.data["state"] == "pending"
+        assert client.get(f"/bills/export/jobs/{job_id}/download/").status_code == 409
+
+        run_export_job(job_id)
+        response = client.get(f"/bills/export/jobs/{job_id}/")
+        assert response.data["state"] == "finished"
+        assert response.data["total_rows"] == 11
+        assert response.data["rows_written"] == 11
+        assert response.data["percent"] == 100
+
+        response = client.get(f"/bills/export/jobs/{job_id}/download/")
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content)
+        if compress:
+            content = gzip.decompress(content)
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        assert rows[0] == ExportData().fields
+        assert len(rows) == 12
+
+    @staticmethod
+    def test_export_job_filters(client):
+        response = client.post(
+            "/bills/export/jobs/", {"note_type": "supply", "store": 1}
+        )
+        run_export_job(response.data["id"])
+        job = ExportJob.objects.get(pk=response.data["id"])
+        assert job.rows_written == 4
+
+    @staticmethod
+    def test_export_job_download_range(client):
+        job_id = client.post("/bills/export/jobs/").data["id"]
+        run_export_job(job_id)
+        url = f"/bills/export/jobs/{job_id}/download/"
+        content = b"".join(client.get(url).streaming_content)
+
+        response = client.get(url, HTTP_RANGE="bytes=10-19")
+        assert response.status_code == 206
+        assert response["Content-Range"] == f"bytes 10-19/{len(content)}"
+        assert b"".join(response.streaming_content) == content[10:20]
+
+        response = client.get(url, HTTP_RANGE="bytes=-5")
+        assert b"".join(response.streaming_content) == content[-5:]
+
+        response = client.get(url, HTTP_RANGE=f"bytes={len(content)}-")
+        assert response.status_code == 416
+
+
+@pytest.mark.django_db
+class TestBatchCreate:
+    @staticmethod
+    def test_batch_create_view(worker_1, django_assert_max_num_queries):
+        for i in range(3):
+            note = Note.objects.get(number="EXT-DIS-1")
+            note.pk, note.number = None, f"EXT-DIS-{i + 2}"
+            note.save()
+        items = [
+            {"note_number": "EXT-DIS-1", "bill": "receipt"},
+            {"note_number": "EXT-DIS-2", "bill": "invoice", "supply_time": 3},
+            {
+                "note_number": "EXT-DIS-3",
+                "bill": "advance_invoice",
+                "advance_value": 50,
+            },
+            {"note_number": "EXT-DIS-4", "bill": "invoice"},
+            {"note_number": "EXT-DIS-4", "bill": "receipt"},
+            {"note_number": "EXT-SUP-1", "bill": "receipt"},
+        ]
+        with django_assert_max_num_queries(12):
+            response = worker_1.post("/bills/batch/create/", items, format="json")
+        assert response.status_code == 200
+        results = response.data["results"]
+        assert [result.get("created") for result in results] == [
+            True,
+            True,
+            True,
+            True,
+            None,
+            None,
+        ]
+        assert results[4]["error"] == "Note given more than once"
+        assert results[5]["error"] == "Note not found"
+
+        receipt = Receipt.objects.get(note__number="EXT-DIS-1")
+        assert receipt.value_gross == Decimal("117.71")
+        assert receipt.receipt_payment.note_id == receipt.note_id
+        invoice = Invoice.objects.get(note__number="EXT-DIS-2")
+        assert invoice.worker.id == 1
+        assert invoice.supply_date == date.today() + timedelta(days=3)
+        assert invoice.value_net == Decimal("95.70")
+        assert invoice.invoice_payment
+        adv_invoice = AdvanceInvoice.objects.get(note__number="EXT-DIS-3")
+        assert adv_invoice.value_net == Decimal("40.65")
+        assert adv_invoice.rest_value_gross == Decimal("67.71")
+        assert adv_invoice.advance_invoice_payment.advance
+
+    @staticmethod
+    def test_batch_create_existing_bills(worker_1):
+        worker_1.post("/bills/adv_invoices/create/EXT-DIS-1/3/50/")
+        items = [
+            {"note_number": "EXT-DIS-1", "bill": "receipt"},
+            {"note_number": "EXT-DIS-1", "bill": "invoice"},
+        ]
+        response = worker_1.post("/bills/batch/create/", items[:1], format="json")
+        assert response.data["results"][0]["error"] == (
+            "Advance invoice for given note has been already created"
+        )
+        response = worker_1.post("/bills/batch/create/", items[1:], format="json")
+        assert response.data["results"][0]["created"]
+        invoice = Invoice.objects.get(note__number="EXT-DIS-1")
+        assert invoice.value_gross == Decimal("67.71")
+        assert (
+            invoice.invoice_payment.advance_invoice_id
+            == invoice.note.advance_invoice.id
+        )
+
+    @staticmethod
+    def test_batch_create_invalid_item(worker_1):
+        items = [{"note_number": "EXT-DIS-1", "bill": "advance_invoice"}]
+        response = worker_1.post("/bills/batch/create/", items, format="json")
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_batch_create():
+    """
+    Batches creating the same bill at once must report the bill created
+    by the other batch instead of failing on the unique Note of bills.
+    """
+
+    threads_count = 4
+    barrier = threading.Barrier(threads_count)
+    results, errors = [], []
+
+    def create():
+        try:
+            barrier.wait()
+            items = [{"note_number": "EXT-DIS-1", "bill": "receipt"}]
+            results.extend(create_bills(items, None))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=create) for _ in range(threads_count)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert not errors
+    assert sorted(result.get("error", "created") for result in results) == [
+        "Receipt for given note has been already created"
+    ] * (threads_count - 1) + ["created"]
+    assert Receipt.objects.filter(note__number="EXT-DIS-1").count() == 1
+
+
+@pytest.mark.django_db
+class TestOverdueInvoices:
+    @staticmethod
+    def test_delay_overdue_invoices():
+        create_billed_notes(5)
+        invoices = list(Invoice.objects.order_by("id"))
+        today = date.today()
+        for invoice, days, state in zip(
+            invoices,
+            (-3, -2, -1, -1, 1),
+            ("in_progress", "in_progress", "in_progress", "executed", "in_progress"),
+        ):
+            Invoice.objects.filter(pk=invoice.pk).update(
+                maturity=today + timedelta(days=days), state=state
+            )
+        Payment(note=invoices[1].note, invoice=invoices[1], paid=True).save()
+        Payment(note=invoices[2].note, invoice=invoices[2]).save()
+
+        out = io.StringIO()
+        call_command("delay_overdue_invoices", "--chunk-size=1", stdout=out)
+        assert out.getvalue() == (
+            "Invoices: 2 delayed, 73.80 gross, "
+            f"oldest maturity {today - timedelta(days=3)}.\n"
+            "Advance invoices: 0 delayed.\n"
+        )
+        assert list(Invoice.objects.order_by("id").values_list("state", flat=True)) == [
+            "delayed",
+            "in_progress",
+            "delayed",
+            "executed",
+            "in_progress",
+        ]
+
+        out = io.StringIO()
+        call_command(
+            "delay_overdue_invoices",
+            f"--date={today + timedelta(days=2)}",
+            stdout=out,
+        )
+        assert out.getvalue().startswith("Invoices: 1 delayed, 36.90 gross")
+
+    @staticmethod
+    def test_overdue_invoices_use_index():
+        plan = overdue_invoices(Invoice, date.today()).explain()
+        assert "(state=? AND maturity<?)" in plan
+
+    @staticmethod
+    def test_run_every(monkeypatch, caplog):
+        stop, calls, closed = threading.Event(), [], []
+        # Closing connections would close the connection of the test.
+        monkeypatch.setattr(
+            "bills.overdue.close_old_connections", lambda: closed.append(None)
+        )
+
+        def sweep():
+            calls.append(None)
+            if len(calls) == 1:
+                raise RuntimeError("database is gone")
+            if len(calls) == 3:
+                stop.set()
+
+        run_every(0, sweep, stop)
+        assert len(calls) == len(closed) == 3
+        assert "sweep failed" in caplog.text
+        assert "database is gone" in caplog.text
+
+    @staticmethod
+    def test_invalid_chunk_size():
+        with pytest.raises(CommandError, match="--chunk-size must be at least 1"):
+            call_command("delay_overdue_invoices", "--chunk-size=0")
+
+
+STATEMENT_CSV = """date,amount,reference,counterparty
+2021-05-01,36.90,Payment for EXT-DIS-BULK-0,Nowak-Invest
+2021-05-01,36.90,"ext-dis-bulk-1, invoice",Jacek  Chmiel
+2021-05-01,30.00,EXT-DIS-BULK-2,nowak-invest
+2021-05-02,-10.00,Fee,Bank
+2021-05-02,36.90,EXT-DIS-BULK-0,nowak-invest
+"""
+
+STATEMENT_MT940 = """:20:STATEMENT
+:25:PL12345678901234567890123456
+:28C:1/1
+:60F:C210501PLN0,00
+:61:2105010501CN36,90NTRFNONREF
+:86:020?00PRZELEW?20EXT-DIS-BULK-2?21 INVOICE
+?32NOWAK-?33INVEST
+:61:210501D10,00NTRFNONREF
+:86:FEE
+:62F:C210501PLN26,90
+"""
+
+
+@pytest.mark.django_db
+class TestStatementImport:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def payments():
+        create_billed_notes(3)
+        for invoice in Invoice.objects.all():
+            Payment(note=invoice.note, invoice=invoice).save()
+
+    @staticmethod
+    def paid():
+        return list(
+            Payment.objects.filter(paid=True)
+            .order_by("note__number")
+            .values_list("note__number", "type")
+        )
+
+    def test_import_csv(self, tmp_path):
+        path = tmp_path / "statement.csv"
+        path.write_text(STATEMENT_CSV)
+        out = io.StringIO()
+        call_command("import_statement", str(path), "--batch-size=2", stdout=out)
+        assert out.getvalue() == (
+            "Unmatched line 4: 2021-05-01 30.00 'EXT-DIS-BULK-2' 'nowak-invest'\n"
+            "Unmatched line 6: 2021-05-02 36.90 'EXT-DIS-BULK-0' 'nowak-invest'\n"
+            "Imported 5 lines: 2 matched, 2 unmatched, 1 debits skipped.\n"
+        )
+        assert self.paid() == [
+            ("EXT-DIS-BULK-0", "transfer"),
+            ("EXT-DIS-BULK-1", "transfer"),
+        ]
+
+    def test_import_resumed(self, tmp_path):
+        lines = STATEMENT_CSV.splitlines(keepends=True)
+        lines[4] = "2021-05-02,ten,Fee,Bank\n"
+        path = tmp_path / "statement.csv"
+        path.write_text("".join(lines))
+        with pytest.raises(CommandError, match="Invalid amount 'ten'"):
+            call_command("import_statement", str(path), "--batch-size=2")
+        paid = [("EXT-DIS-BULK-0", "transfer"), ("EXT-DIS-BULK-1", "transfer")]
+        assert self.paid() == paid
+
+        path.write_text(STATEMENT_CSV)
+        out = io.StringIO()
+        call_command("import_statement", str(path), "--batch-size=2", stdout=out)
+        assert out.getvalue().endswith(
+            "Imported 5 lines: 0 matched, 4 unmatched, 1 debits skipped.\n"
+        )
+        assert self.paid() == paid
+
+    def test_import_view_mt940(self, worker_1):
+        upload = SimpleUploadedFile("statement.sta", STATEMENT_MT940.encode())
+        response = worker_1.post("/bills/payments/import/", {"file": upload})
+        assert response.status_code == 200
+        assert response.data == {
+            "lines": 2,
+            "matched": 1,
+            "unmatched": 0,
+            "skipped": 1,
+            "unmatched_lines": [],
+        }
+        assert self.paid() == [("EXT-DIS-BULK-2", "transfer")]
+
+    def test_import_view_invalid(self, worker_1):
+        upload = SimpleUploadedFile("statement.csv", b"date,amount\n2021-05-01,1\n")
+        response = worker_1.post("/bills/payments/import/", {"file": upload})
+        assert response.status_code == 400
+        assert response.data == {"error": "Missing columns: counterparty, reference"}
+        assert worker_1.post("/bills/payments/import/").status_code == 400
+
+        lines = STATEMENT_CSV.splitlines(keepends=True)
+        lines[4] = "2021-05-02,ten,Fee,Bank\n"
+        upload = SimpleUploadedFile("statement.csv", "".join(lines).encode())
+        response = worker_1.post("/bills/payments/import/", {"file": upload})
+        assert response.status_code == 400
+        assert not self.paid()
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "statement, error",
+        [
+            ("date,amount,reference,counterparty\n2021-01-01\n", "Missing values"),
+            ("date,amount,reference,counterparty\n2021-13-01,1,,\n", "Invalid date"),
+            (":20:STATEMENT\n:61:219999C100,00\n", "Invalid date"),
+        ],
+    )
+    def test_import_view_malformed(worker_1, statement, error):
+        upload = SimpleUploadedFile("statement.txt", statement.encode())
+        response = worker_1.post("/bills/payments/import/", {"file": upload})
+        assert response.status_code == 400
+        assert response.data["error"].startswith(error)
+
+    @staticmethod
+    def test_parse_mt940():
+        lines = list(parse_statement(STATEMENT_MT940.splitlines(keepends=True)))
+        assert [
+            (line.line, line.amount, line.reference, line.counterparty)
+            for line in lines
+        ] == [
+            (5, Decimal("36.90"), "EXT-DIS-BULK-2 INVOICE", "NOWAK-INVEST"),
+            (8, Decimal("-10.00"), "FEE", ""),
+        ]
+
+
+@pytest.mark.django_db(transaction=True, reset_sequences=True)
+class TestReplicaRouting:
+    @staticmethod
+    def respond(request):
+        """Returns a response with the database used for reads as content."""
+
+        def get_response(request):
+            return HttpResponse(ReplicaRouter().db_for_read(Receipt))
+
+        return ReplicaMiddleware(get_response)(request)
+
+    def route(self, request):
+        """Returns the database used for reads during the request."""
+
+        return self.respond(request).content.decode()
+
+    def test_reads_of_safe_requests_use_replica(self, rf, settings):
+        settings.DATABASE_REPLICAS = ["replica"]
+        assert self.route(rf.get("/bills/receipts/")) == "replica"
+        assert self.route(rf.post("/bills/batch/create/")) == "default"
+        assert ReplicaRouter().db_for_read(Receipt) == "default"
+        assert ReplicaRouter().db_for_write(Receipt) == "default"
+
+    def test_client_reads_own_writes(self, rf, settings):
+        settings.DATABASE_REPLICAS = ["replica"]
+        pin = self.respond(rf.post("/bills/batch/create/")).cookies[PIN_COOKIE]
+        assert pin["max-age"] == settings.REPLICA_PIN_SECONDS
+
+        def route(cookie):
+            """Routes a GET of a client sending the cookie, in any process."""
+
+            request = rf.get("/bills/receipts/")
+            if cookie:
+                request.COOKIES[PIN_COOKIE] = cookie
+            return self.route(request)
+
+        assert route(pin.value) == "default"
+        assert route(None) == "replica"
+        assert route("1") == "replica"
+        settings.REPLICA_PIN_SECONDS = -1
+        assert route(pin.value) == "replica"
+
+    def test_transactions_use_primary(self, rf, settings):
+        settings.DATABASE_REPLICAS = ["replica"]
+
+        def get_response(request):
+            with transaction.atomic():
+                return HttpResponse(ReplicaRouter().db_for_read(Receipt))
+
+        response = ReplicaMiddleware(get_response)(rf.get("/bills/receipts/"))
+        assert response.content == b"default"
+
+    @staticmethod
+    @pytest.fixture
+    def replica(settings, tmp_path):
+        """Adds a replica database, a copy of the primary with two receipts."""
+
+        create_billed_notes(2)
+        path = tmp_path / "replica.sqlite3"
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+        copy.close()
+        connections.databases["replica"] = dict(
+            connections.databases["default"], NAME=str(path)
+        )
+        settings.DATABASE_REPLICAS = ["replica"]
+        yield
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+
+    @staticmethod
+    def test_requests_read_replica(replica, worker_1):
+        Receipt.objects.filter(note__number="EXT-DIS-BULK-1").delete()
+
+        def numbers():
+            response = worker_1.get("/bills/receipts/")
+            return sorted(row["note"]["number"] for row in response.data["results"])
+
+        assert numbers() == ["EXT-DIS-BULK-0", "EXT-DIS-BULK-1"]
+        # After a write the client reads the primary.
+        assert worker_1.post("/bills/receipts/create/EXT-DIS-1/").status_code == 200
+        assert numbers() == ["EXT-DIS-1", "EXT-DIS-BULK-0"]
+
+    @staticmethod
+    def test_streamed_content_uses_replica(rf, settings):
+        settings.DATABASE_REPLICAS = ["replica"]
+
+        def chunks():
+            yield ReplicaRouter().db_for_read(Receipt)
+
+        def get_response(request):
+            return StreamingHttpResponse(chunks())
+
+        response = ReplicaMiddleware(get_response)(rf.get("/bills/export/"))
+        assert b"".join(response.streaming_content) == b"replica"
+
+
+def asgi_get(path, token=None):
+    """Sends a GET request to the ASGI application, returns status and body."""
+
+    headers = [(b"host", b"testserver")]
+    if token:
+        headers.append((b"authorization", f"Token {token}".encode()))
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": b"",
+        "headers": headers,
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 12345),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(application)(scope, receive, send)
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], body
+
+
+@pytest.mark.django_db(transaction=True, reset_sequences=True)
+class TestAsyncViews:
+    @staticmethod
+    def test_list_and_detail_views(worker_1):
+        token = Token.objects.create(user=User.objects.get(username="tom_hagen"))
+        create_billed_notes(3)
+        for url in (
+            "/bills/receipts/",
+            "/bills/invoices/",
+            "/bills/invoices/EXT-DIS-BULK-1/",
+        ):
+            status, body = asgi_get(url, token.key)
+            assert status == 200
+            assert body == worker_1.get(url).content
+
+    @staticmethod
+    def test_export(client):
+        create_billed_notes(3)
+        status, body = asgi_get("/bills/export/")
+        assert status == 200
+        assert body == b"".join(client.get("/bills/export/").streaming_content)
+        status, body = asgi_get("/bills/export/EXT-DIS-BULK-1/")
+        assert body.count(b"EXT-DIS-BULK-1") == 3
+
+    @staticmethod
+    def test_export_pages():
+        create_billed_notes(3)
+        notes = Note.objects.all()
+        pages, after = [], None
+        while True:
+            text, after = export_page(notes, after, page_size=2)
+            pages.append(text)
+            if after is None:
+                break
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(export_rows(notes))
+        assert len(pages) > 2
+        assert "".join(pages) == buffer.getvalue()
+
+    @staticmethod
+    def test_metrics_of_async_views():
+        registry.clear()
+        asgi_get("/bills/export/")
+        text = registry.render()
+        assert (
+            'http_requests_total{view="api:export_list",method="GET",status="200"} 1'
+            in text
+        )
+        queries = [
+            line
+            for line in text.splitlines()
+            if line.startswith('http_request_db_queries_sum{view="api:export_list"')
+        ]
+        assert float(queries[0].split()[-1]) > 0
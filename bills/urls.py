@@ -20,6 +20,7 @@ urlpatterns = [
         views.AdvanceInvoiceCreateView.as_view(),
         name="adv_invoice_create",
     ),
+    path("batch/create/", views.BillBatchCreateView.as_view(), name="batch_create"),
     path(
         "invoices/update/<str:note_number>/<int:supply_time>/<str:state>/",
         views.InvoiceUpdateView.as_view(),
@@ -66,10 +67,28 @@ urlpatterns = [
         "adv_invoices/", views.AdvanceInvoiceListView.as_view(), name="adv_invoice_list"
     ),
     path("export/", views.ExportData.as_view(), name="export_list"),
+    path(
+        "export/jobs/", views.ExportJobCreateView.as_view(), name="export_job_create"
+    ),
+    path(
+        "export/jobs/<int:pk>/",
+        views.ExportJobDetailView.as_view(),
+        name="export_job_detail",
+    ),
+    path(
+        "export/jobs/<int:pk>/download/",
+        views.ExportJobDownloadView.as_view(),
+        name="export_job_download",
+    ),
     path(
         "export/<str:note_number>/",
         views.ExportData.as_view(),
         name="export_detail",
     ),
+    path(
+        "payments/import/",
+        views.PaymentImportView.as_view(),
+        name="payment_import",
+    ),
     path("test_data/", views.AddTestData.as_view(), name="test_data"),
 ]
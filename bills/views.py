@@ -1,19 +1,34 @@
-import csv
+import io
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from django.http import HttpResponse
+from accounts.authentication import (
+    CachedBasicAuthentication,
+    CachedTokenAuthentication,
+)
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from notes.models import Note
-from rest_framework import generics
-from rest_framework.authentication import BasicAuthentication
+from notes.models import Note, NotePosition
+from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from storage_manager_api.loader import bulk_load
 from test_data import test_data
 
-from .models import Payment, Receipt, Invoice, AdvanceInvoice
+from .batch import create_bills
+from .exports import FIELDS, csv_chunks, export_rows, file_response, submit_export_job
+from .models import Payment, Receipt, Invoice, AdvanceInvoice, ExportJob
 from .permissions import IsWorker
-from .serializers import ReceiptSerializer, InvoiceSerializer, AdvanceInvoiceSerializer
+from .serializers import (
+    ReceiptSerializer,
+    InvoiceSerializer,
+    AdvanceInvoiceSerializer,
+    ExportJobSerializer,
+    BillBatchItemSerializer,
+)
+from .statements import StatementError, import_statement, parse_statement
 
 
 class AddTestData(APIView):
@@ -21,49 +36,68 @@ class AddTestData(APIView):
         """Adds test data to the database."""
 
         if not Note.objects.first():
-            for model, values in test_data.items():
-                for data in values:
-                    model(**data).save()
+            bulk_load(test_data)
             return Response({"ok": "Test data uploaded"})
         else:
             return Response({"ok": "Test data uploaded already"})
 
 
+def with_note_details(queryset):
+    """
+    Loads the Note with its positions, products and contractor
+    in a fixed number of queries, as required by the bill serializers.
+    """
+
+    return queryset.select_related("note__to_contractor__user").prefetch_related(
+        Prefetch(
+            "note__positions",
+            queryset=NotePosition.objects.select_related("product"),
+        )
+    )
+
+
+receipts = with_note_details(Receipt.objects.all())
+invoices = with_note_details(Invoice.objects.select_related("worker__user"))
+advance_invoices = with_note_details(
+    AdvanceInvoice.objects.select_related("worker__user")
+)
+
+
 class ReceiptListView(generics.ListAPIView):
-    queryset = Receipt.objects.all()
+    queryset = receipts
     serializer_class = ReceiptSerializer
 
 
 class InvoiceListView(generics.ListAPIView):
-    queryset = Invoice.objects.all()
+    queryset = invoices
     serializer_class = InvoiceSerializer
 
 
 class AdvanceInvoiceListView(generics.ListAPIView):
-    queryset = AdvanceInvoice.objects.all()
+    queryset = advance_invoices
     serializer_class = AdvanceInvoiceSerializer
 
 
 class ReceiptDetailView(generics.RetrieveAPIView):
-    queryset = Receipt.objects.all()
+    queryset = receipts
     serializer_class = ReceiptSerializer
     lookup_field = "note__number"
 
 
 class InvoiceDetailView(generics.RetrieveAPIView):
-    queryset = Invoice.objects.all()
+    queryset = invoices
     serializer_class = InvoiceSerializer
     lookup_field = "note__number"
 
 
 class AdvanceInvoiceDetailView(generics.RetrieveAPIView):
-    queryset = AdvanceInvoice.objects.all()
+    queryset = advance_invoices
     serializer_class = AdvanceInvoiceSerializer
     lookup_field = "note__number"
 
 
 class ReceiptCreateView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def post(self, request, note_number):
@@ -88,7 +122,7 @@ class ReceiptCreateView(APIView):
 
 
 class InvoiceCreateView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def post(self, request, note_number, supply_time):
@@ -117,7 +151,7 @@ class InvoiceCreateView(APIView):
 
 
 class AdvanceInvoiceCreateView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def post(self, request, note_number, supply_time, advance_value):
@@ -148,8 +182,19 @@ class AdvanceInvoiceCreateView(APIView):
         return Response({"created": True})
 
 
+class BillBatchCreateView(APIView):
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsWorker,)
+
+    def post(self, request):
+        serializer = BillBatchItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        results = create_bills(serializer.validated_data, request.user.worker)
+        return Response({"results": results})
+
+
 class InvoiceUpdateView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def put(self, request, note_number, supply_time, state):
@@ -162,7 +207,7 @@ class InvoiceUpdateView(APIView):
 
 
 class AdvanceInvoiceUpdateView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def put(self, request, note_number, supply_time, state, advance_value):
@@ -176,7 +221,7 @@ class AdvanceInvoiceUpdateView(APIView):
 
 
 class ReceiptDeleteView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def delete(self, request, note_number):
@@ -185,7 +230,7 @@ class ReceiptDeleteView(APIView):
 
 
 class InvoiceDeleteView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def delete(self, request, note_number):
@@ -194,7 +239,7 @@ class InvoiceDeleteView(APIView):
 
 
 class AdvanceInvoiceDeleteView(APIView):
-    authentication_classes = (BasicAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
     permission_classes = (IsWorker,)
 
     def delete(self, request, note_number):
@@ -202,58 +247,89 @@ class AdvanceInvoiceDeleteView(APIView):
         return Response({"deleted": True})
 
 
+def export_notes(note_number=None):
+    """Returns the Notes exported by the export endpoints."""
+
+    if note_number:
+        return Note.objects.filter(number=note_number)
+    return Note.objects.filter(type="dispatch", handover_type="external")
+
+
 class ExportData(APIView):
     def get(self, request, note_number=None):
-        if note_number:
-            notes = Note.objects.filter(number=note_number).all()
-        else:
-            notes = Note.objects.filter(type="dispatch", handover_type="external").all()
-        rows = self.prepare_data_to_csv(notes)
-        response = HttpResponse(content_type="text/csv")
+        notes = export_notes(note_number)
+        response = StreamingHttpResponse(
+            csv_chunks(self.prepare_data_to_csv(notes)), content_type="text/csv"
+        )
         response["Content-Disposition"] = 'attachment; filename="export.csv"'
-        writer = csv.writer(response)
-        [writer.writerow(row) for row in rows]
         return response
 
     @property
     def fields(self):
-        return [
-            "marketplace",
-            "country",
-            "invoice_id",
-            "transaction_id",
-            "transaction_time",
-            "transaction_type",
-            "item_name",
-            "item_type",
-            "units",
-            "marketplace_currency",
-            "sales_price",
-            "estimated_earnings",
-            "client_id",
-            "receipt_id",
-        ]
+        return FIELDS
 
     def prepare_data_to_csv(self, notes):
-        rows = [self.fields]
-        for note in notes:
-            for item in note.positions.all():
-                from_entity = note.from_store if note.from_store else note.from_shop
-                row = [
-                    from_entity.city,
-                    "PL",
-                    note.invoice.id if hasattr(note, "invoice") else None,
-                    note.number,
-                    note.updated,
-                    note.type,
-                    item.product.name,
-                    item.product.category.name,
-                    item.product.unit,
-                    "PLN",
-                    item.price_net,
-                    item.price_net - item.product.purchase_price,
-                    note.to_contractor.id,
-                    note.receipt.id if hasattr(note, "receipt") else None,
-                ]
-                rows.append(row)
-        return rows
+        yield self.fields
+        yield from export_rows(notes)
+
+
+class ExportJobCreateView(generics.CreateAPIView):
+    serializer_class = ExportJobSerializer
+
+    def perform_create(self, serializer):
+        submit_export_job(serializer.save())
+
+
+class ExportJobDetailView(generics.RetrieveAPIView):
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+
+
+class ExportJobDownloadView(APIView):
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk)
+        if job.state != "finished":
+            return Response(
+                {"error": f"Export job is {job.state}"}, status=status.HTTP_409_CONFLICT
+            )
+        return file_response(
+            job.file,
+            request.META.get("HTTP_RANGE"),
+            "application/gzip" if job.compress else "text/csv",
+            job.filename,
+        )
+
+
+class PaymentImportView(APIView):
+    """
+    Marks Payments paid by transfers of an uploaded csv or MT940
+    bank statement, reporting up to UNMATCHED_LIMIT unmatched lines.
+    """
+
+    UNMATCHED_LIMIT = 1000
+
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsWorker,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Statement file is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        unmatched = []
+
+        def report(line):
+            if len(unmatched) < self.UNMATCHED_LIMIT:
+                unmatched.append(dict(line._asdict(), amount=str(line.amount)))
+
+        lines = io.TextIOWrapper(upload, encoding="utf-8", errors="replace", newline="")
+        try:
+            summary = import_statement(
+                parse_statement(lines, request.data.get("format")), unmatched=report
+            )
+        except StatementError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dict(summary, unmatched_lines=unmatched))
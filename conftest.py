@@ -1,16 +1,28 @@
 import pytest
 from accounts.models import User
+from django.conf import settings
 from rest_framework.test import APIClient
+from storage_manager_api.loader import bulk_load
 from test_data import test_data
 
 
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(tmp_path_factory):
+    """
+    Keeps the test database in a file, so concurrent writers wait for
+    each other with busy_timeout as they do in production, instead of
+    failing on table locks of a shared in-memory database.
+    """
+
+    path = tmp_path_factory.mktemp("db") / "test.sqlite3"
+    settings.DATABASES["default"]["TEST"]["NAME"] = str(path)
+
+
 @pytest.fixture(autouse=True)
 def populate_db_with_test_data():
     """Adds test data to the database."""
 
-    for model, values in test_data.items():
-        for data in values:
-            model(**data).save()
+    bulk_load(test_data)
 
 
 @pytest.fixture
@@ -33,3 +45,19 @@ def worker_2():
     client = APIClient()
     client.force_authenticate(user)
     return client
+
+
+@pytest.fixture
+def assert_query_budget(django_assert_max_num_queries):
+    """
+    Provides a check which fails when a GET request to the given url
+    runs more SQL queries than the declared budget.
+    """
+
+    def check(client, url, budget):
+        with django_assert_max_num_queries(budget):
+            response = client.get(url)
+        assert response.status_code == 200
+        return response
+
+    return check
@@ -0,0 +1,54 @@
+from accounts.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from monitoring.slow_queries import slow_query_log
+from rest_framework.test import APIClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends GET requests to the given URLs in this process and lists "
+        "the logged slow queries with the most total time. The log is kept "
+        "per process, GET /metrics/slow-queries/ shows the log of a server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="URLs to request, e.g. /bills/.")
+        parser.add_argument(
+            "--user", help="Username of the User the requests are authenticated as."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0,
+            help="Log queries slower than this number of milliseconds.",
+        )
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument(
+            "--plans", action="store_true", help="Print plans of the queries."
+        )
+
+    def handle(self, *args, urls, user, threshold, limit, plans, **options):
+        client = APIClient()
+        if user:
+            try:
+                client.force_authenticate(User.objects.get(username=user))
+            except User.DoesNotExist:
+                raise CommandError(f"User {user} does not exist.")
+        slow_query_log.clear()
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=threshold):
+            for url in urls:
+                response = client.get(url)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                self.stdout.write(f"GET {url}: {response.status_code}")
+        for group in slow_query_log.top(limit):
+            self.stdout.write(
+                f"\n{group['total_ms']:.1f} ms total, {group['count']} queries, "
+                f"max {group['max_ms']:.1f} ms, views {', '.join(group['views'])}\n"
+                f"  {group['fingerprint']}"
+            )
+            if plans and group["plan"]:
+                for line in group["plan"].splitlines():
+                    self.stdout.write(f"    {line}")
@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus format.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """Yields (le, cumulative count) pairs, ending with +Inf."""
+
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+
+class EndpointMetrics:
+    """
+    Aggregates of requests to one endpoint.
+    """
+
+    __slots__ = ("latency", "queries", "db_time", "response_size", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_time = 0.0
+        self.response_size = 0
+        self.statuses = defaultdict(int)
+
+
+class Registry:
+    """
+    In-process aggregates of requests by view name and method.
+    Every process keeps its own, so each worker is scraped separately.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointMetrics)
+
+    def record(self, view, method, status, latency, queries, db_time, size):
+        with self.lock:
+            metrics = self.endpoints[view, method]
+            metrics.latency.observe(latency)
+            metrics.queries.observe(queries)
+            metrics.db_time += db_time
+            metrics.response_size += size
+            metrics.statuses[status] += 1
+
+    def clear(self):
+        with self.lock:
+            self.endpoints.clear()
+
+    def render(self):
+        """Returns the metrics in the Prometheus text format."""
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name, attribute):
+            for (view, method), metrics in endpoints:
+                histogram = getattr(metrics, attribute)
+                labels = f'view="{view}",method="{method}"'
+                for bound, count in histogram.samples():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            family(
+                "http_requests_total",
+                "counter",
+                "Requests by view, method and status code.",
+            )
+            for (view, method), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'http_requests_total{{view="{view}",method="{method}",'
+                        f'status="{status}"}} {count}'
+                    )
+            family(
+                "http_request_duration_seconds",
+                "histogram",
+                "Time from receiving a request to sending its whole response.",
+            )
+            histograms("http_request_duration_seconds", "latency")
+            family(
+                "http_request_db_queries",
+                "histogram",
+                "SQL queries run by a request.",
+            )
+            histograms("http_request_db_queries", "queries")
+            family(
+                "http_request_db_seconds_total",
+                "counter",
+                "Time spent in SQL queries.",
+            )
+            for (view, method), metrics in endpoints:
+                lines.append(
+                    f'http_request_db_seconds_total{{view="{view}",method="{method}"}} '
+                    f"{metrics.db_time}"
+                )
+            family(
+                "http_response_size_bytes_total",
+                "counter",
+                "Bytes of response bodies.",
+            )
+            for (view, method), metrics in endpoints:
+                lines.append(
+                    f'http_response_size_bytes_total{{view="{view}",method="{method}"}} '
+                    f"{metrics.response_size}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,183 @@
+import time
+from hmac import compare_digest
+
+from django.conf import settings
+from storage_manager_api.handlers import AsyncCapableMiddleware
+
+from .metrics import registry
+from .profiling import RequestProfile
+from .queries import QueryStats, query_stats, view_name
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records latency, SQL queries, database time, response size
+    and status code of every request in the metrics registry.
+    Streamed responses are recorded when their content is sent.
+    """
+
+    def handle(self, request):
+        stats = QueryStats(request)
+        start = time.perf_counter()
+        token = query_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        return self.record(request, response, stats, start)
+
+    async def ahandle(self, request):
+        stats = QueryStats(request)
+        start = time.perf_counter()
+        token = query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        return self.record(request, response, stats, start)
+
+    def record(self, request, response, stats, start):
+        def record(size):
+            registry.record(
+                view_name(request),
+                request.method,
+                response.status_code,
+                time.perf_counter() - start,
+                stats.count,
+                stats.duration,
+                size,
+            )
+
+        if getattr(response, "is_async", False):
+            response.streaming_content = self.astream(
+                response.streaming_content, stats, record
+            )
+        elif response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, stats, record
+            )
+        else:
+            record(len(response.content))
+        return response
+
+    @staticmethod
+    def stream(chunks, stats, record):
+        """
+        Yields the chunks, collecting queries run to produce them,
+        and records the request when the content is sent or closed.
+        """
+
+        size = 0
+        chunks = iter(chunks)
+        try:
+            while True:
+                token = query_stats.set(stats)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    query_stats.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            record(size)
+
+    @staticmethod
+    async def astream(chunks, stats, record):
+        """Async version of stream()."""
+
+        size = 0
+        try:
+            while True:
+                token = query_stats.set(stats)
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    query_stats.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            record(size)
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Profiles requests sent with PROFILING_TOKEN in the X-Profile header
+    or the profile query parameter, saving the profile to PROFILE_ROOT
+    and returning its id in the X-Profile-Id header. Other requests
+    only pay for the check of the header.
+
+    Under ASGI the profile covers the event loop thread, so work of async
+    views done in the database thread pool appears in the SQL timeline only.
+    """
+
+    @staticmethod
+    def profiled(request):
+        token = request.META.get("HTTP_X_PROFILE") or request.GET.get("profile")
+        if not token or not settings.PROFILING_TOKEN:
+            return False
+        # compare_digest accepts only ASCII strings, so bytes are compared.
+        return compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+
+    def handle(self, request):
+        if not self.profiled(request):
+            return self.get_response(request)
+        profile = RequestProfile(request)
+        response = profile.run(self.get_response, request)
+        return self.save(profile, response)
+
+    async def ahandle(self, request):
+        if not self.profiled(request):
+            return await self.get_response(request)
+        profile = RequestProfile(request)
+        response = await profile.arun(self.get_response(request))
+        return self.save(profile, response)
+
+    def save(self, profile, response):
+        response["X-Profile-Id"] = profile.id
+        if getattr(response, "is_async", False):
+            response.streaming_content = self.astream(
+                response.streaming_content, profile, response.status_code
+            )
+        elif response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, profile, response.status_code
+            )
+        else:
+            profile.save(response.status_code)
+        return response
+
+    @staticmethod
+    def stream(chunks, profile, status_code):
+        """
+        Yields the chunks produced under the profile
+        and saves it when the content is sent or closed.
+        """
+
+        chunks = iter(chunks)
+        try:
+            while True:
+                try:
+                    chunk = profile.run(next, chunks)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            profile.save(status_code)
+
+    @staticmethod
+    async def astream(chunks, profile, status_code):
+        """Async version of stream()."""
+
+        try:
+            while True:
+                try:
+                    chunk = await profile.arun(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            profile.save(status_code)
@@ -0,0 +1,76 @@
+import cProfile
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+from .queries import query_timeline, view_name
+
+
+class RequestProfile:
+    """
+    cProfile profile and SQL timeline of one request, collected
+    in steps, as streamed content is produced after the view returns.
+    """
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.timeline = []
+        self.start = time.perf_counter()
+
+    def run(self, function, *args):
+        """Calls the function with the profiler and the timeline enabled."""
+
+        token = query_timeline.set(self.timeline)
+        self.profiler.enable()
+        try:
+            return function(*args)
+        finally:
+            self.profiler.disable()
+            query_timeline.reset(token)
+
+    async def arun(self, awaitable):
+        """Awaits with the profiler and the timeline enabled."""
+
+        token = query_timeline.set(self.timeline)
+        self.profiler.enable()
+        try:
+            return await awaitable
+        finally:
+            self.profiler.disable()
+            query_timeline.reset(token)
+
+    def save(self, status_code):
+        """
+        Writes <id>.prof in the pstats format and <id>.json with
+        the SQL timeline to PROFILE_ROOT.
+        """
+
+        os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+        path = os.path.join(settings.PROFILE_ROOT, self.id)
+        self.profiler.dump_stats(f"{path}.prof")
+        with open(f"{path}.json", "w") as file:
+            json.dump(
+                {
+                    "id": self.id,
+                    "method": self.request.method,
+                    "path": self.request.get_full_path(),
+                    "view": view_name(self.request),
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+                    "queries": [
+                        {
+                            "start_ms": round((start - self.start) * 1000, 3),
+                            "duration_ms": round(duration * 1000, 3),
+                            "sql": sql,
+                        }
+                        for start, duration, sql in self.timeline
+                    ],
+                },
+                file,
+                indent=2,
+            )
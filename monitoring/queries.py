@@ -0,0 +1,66 @@
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .slow_queries import explaining, slow_query_log
+
+query_stats = ContextVar("query_stats", default=None)
+# List of (start, duration, sql) of queries of a profiled request.
+query_timeline = ContextVar("query_timeline", default=None)
+
+
+class QueryStats:
+    """
+    Number and total time of SQL queries run while collecting
+    for the request, if any.
+    """
+
+    __slots__ = ("count", "duration", "request")
+
+    def __init__(self, request=None):
+        self.count = 0
+        self.duration = 0.0
+        self.request = request
+
+
+def view_name(request):
+    """Returns the URL name of the view, e.g. 'api:invoice_list'."""
+
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper adding queries to the QueryStats collected
+    in the current context, if any, and logging slow queries.
+    """
+
+    if explaining.get():
+        return execute(sql, params, many, context)
+    stats = query_stats.get()
+    start = time.perf_counter()
+    try:
+        result = execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+        timeline = query_timeline.get()
+        if timeline is not None:
+            timeline.append((start, duration, sql))
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is not None and duration * 1000 >= threshold:
+        slow_query_log.record(
+            context["connection"],
+            sql,
+            params,
+            many,
+            duration,
+            view_name(stats.request) if stats else "-",
+        )
+    return result
@@ -0,0 +1,12 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .queries import record_query
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # Wrappers stay on the connection object, which is reused
+    # when the database connection is reopened.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,141 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+# Set while a plan is explained, so the EXPLAIN query is not logged itself.
+explaining = ContextVar("explaining", default=False)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+SPACES = re.compile(r"\s+")
+EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def fingerprint(sql):
+    """
+    Returns the SQL with literals and placeholders replaced by '?'
+    and lists of them by '(...)', so repeated queries are grouped.
+    """
+
+    sql = LITERALS.sub("?", sql)
+    sql = LISTS.sub("(...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def explain(connection, sql, params, many):
+    """Returns the plan of the query, or the error raised explaining it."""
+
+    if not sql.lstrip().upper().startswith(EXPLAINED):
+        return ""
+    if many:
+        params = next(iter(params), None)
+    token = explaining.set(True)
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        # A failed EXPLAIN must not break the transaction of the request,
+        # and outside of one it must not start a write transaction.
+        if connection.in_atomic_block:
+            savepoint = transaction.atomic(using=connection.alias)
+        else:
+            savepoint = nullcontext()
+        with savepoint:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+    finally:
+        explaining.reset(token)
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of the latest queries slower than SLOW_QUERY_THRESHOLD_MS,
+    with the plan of every fingerprint explained when it is first logged.
+    Plans are dropped with the last entry of their fingerprint, so they
+    are bounded by the size of the buffer. Every process keeps its own log.
+    """
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen=size)
+        self.plans = {}
+        self.counts = Counter()
+
+    def record(self, connection, sql, params, many, duration, view):
+        key = fingerprint(sql)
+        plan = None
+        if key not in self.plans:
+            plan = explain(connection, sql, params, many)
+        with self.lock:
+            evicted = None
+            if len(self.entries) == self.entries.maxlen:
+                evicted = self.entries[0]["fingerprint"]
+            self.entries.append(
+                {
+                    "fingerprint": key,
+                    "sql": sql,
+                    "view": view,
+                    "duration_ms": round(duration * 1000, 3),
+                    "time": time.time(),
+                }
+            )
+            self.counts[key] += 1
+            if plan is not None:
+                self.plans.setdefault(key, plan)
+            if evicted is not None:
+                self.counts[evicted] -= 1
+                if not self.counts[evicted]:
+                    del self.counts[evicted]
+                    self.plans.pop(evicted, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.plans.clear()
+            self.counts.clear()
+
+    def recent(self, limit=None):
+        """Returns the latest entries, newest first."""
+
+        with self.lock:
+            entries = list(self.entries)
+        return entries[::-1][:limit]
+
+    def top(self, limit=20):
+        """Returns fingerprints of the logged queries by total time."""
+
+        groups = {}
+        for entry in self.recent():
+            group = groups.get(entry["fingerprint"])
+            if group is None:
+                group = groups[entry["fingerprint"]] = {
+                    "id": hashlib.sha1(entry["fingerprint"].encode()).hexdigest()[:12],
+                    "fingerprint": entry["fingerprint"],
+                    "sql": entry["sql"],
+                    "count": 0,
+                    "total_ms": 0,
+                    "max_ms": 0,
+                    "views": set(),
+                    "plan": self.plans.get(entry["fingerprint"], ""),
+                }
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+            group["views"].add(entry["view"])
+        offenders = sorted(groups.values(), key=lambda group: -group["total_ms"])
+        for group in offenders:
+            group["total_ms"] = round(group["total_ms"], 3)
+            group["views"] = sorted(group["views"])
+        return offenders[:limit]
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
@@ -0,0 +1,234 @@
+import io
+import json
+import pstats
+import re
+
+import pytest
+from accounts.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+from notes.models import Note
+from rest_framework.test import APIClient
+
+from .metrics import Histogram, Registry, registry
+from .middleware import MetricsMiddleware
+from .slow_queries import SlowQueryLog, fingerprint, slow_query_log
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    registry.clear()
+    slow_query_log.clear()
+
+
+def sample(text, name, **labels):
+    """Returns the value of the sample with the given name and labels."""
+
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)\{(.*)\} (\S+)", line)
+        if match and match[1] == name:
+            found = dict(re.findall(r'(\w+)="([^"]*)"', match[2]))
+            if found == labels:
+                return float(match[3])
+    return None
+
+
+@pytest.mark.django_db
+class TestRegistry:
+    @staticmethod
+    def test_histogram_is_cumulative():
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        assert list(histogram.samples()) == [(1, 2), (5, 3), ("+Inf", 4)]
+        assert histogram.sum == 14
+
+    @staticmethod
+    def test_render():
+        metrics = Registry()
+        metrics.record("api:receipt_list", "GET", 200, 0.02, 3, 0.004, 100)
+        metrics.record("api:receipt_list", "GET", 404, 0.01, 1, 0.001, 20)
+        text = metrics.render()
+        labels = {"view": "api:receipt_list", "method": "GET"}
+        assert sample(text, "http_requests_total", status="200", **labels) == 1
+        assert sample(text, "http_requests_total", status="404", **labels) == 1
+        assert (
+            sample(text, "http_request_duration_seconds_bucket", le="0.01", **labels)
+            == 1
+        )
+        assert sample(text, "http_request_db_queries_sum", **labels) == 4
+        assert sample(text, "http_response_size_bytes_total", **labels) == 120
+        assert "# TYPE http_request_duration_seconds histogram" in text
+
+
+@pytest.mark.django_db
+class TestMiddleware:
+    @staticmethod
+    def test_requests_are_recorded(worker_1, client):
+        worker_1.get("/bills/receipts/")
+        worker_1.get("/bills/receipts/")
+        worker_1.get("/bills/missing/")
+        response = client.get("/metrics/")
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.content.decode()
+        labels = {"view": "api:receipt_list", "method": "GET"}
+        assert sample(text, "http_requests_total", status="200", **labels) == 2
+        assert sample(text, "http_request_db_queries_sum", **labels) > 0
+        assert sample(text, "http_request_db_seconds_total", **labels) > 0
+        assert sample(text, "http_response_size_bytes_total", **labels) > 0
+        assert (
+            sample(
+                text,
+                "http_requests_total",
+                view="unresolved",
+                method="GET",
+                status="404",
+            )
+            == 1
+        )
+
+    @staticmethod
+    def test_streamed_response_is_recorded_when_sent():
+        def view(request):
+            return StreamingHttpResponse(iter([b"a,b\n", b"1,2\n"]))
+
+        response = MetricsMiddleware(view)(RequestFactory().get("/export/"))
+        labels = {"view": "unresolved", "method": "GET"}
+        assert sample(registry.render(), "http_requests_total", **labels) is None
+        assert b"".join(response.streaming_content) == b"a,b\n1,2\n"
+        text = registry.render()
+        assert sample(text, "http_requests_total", status="200", **labels) == 1
+        assert sample(text, "http_response_size_bytes_total", **labels) == 8
+
+
+@pytest.mark.django_db
+class TestSlowQueryLog:
+    @staticmethod
+    def test_fingerprint():
+        assert fingerprint(
+            'SELECT "id" FROM "notes_note" WHERE "number" = %s AND "id" IN (%s, %s)'
+            "  AND \"type\" = 'supply' LIMIT 21"
+        ) == (
+            'SELECT "id" FROM "notes_note" WHERE "number" = ? AND "id" IN (...)'
+            ' AND "type" = ? LIMIT ?'
+        )
+        assert fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)") == (
+            "INSERT INTO t (a, b) VALUES (...)"
+        )
+
+    @staticmethod
+    def test_queries_over_threshold_are_logged(settings, worker_1):
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        for note in Note.objects.all():
+            worker_1.get(f"/bills/receipts/{note.number}/")
+        top = slow_query_log.top()
+        assert top[0]["total_ms"] >= top[-1]["total_ms"]
+        lookups = [
+            group
+            for group in top
+            if group["views"] == ["api:receipt_detail"]
+            and '"notes_note"."number" = ?' in group["fingerprint"]
+        ]
+        assert lookups[0]["count"] == Note.objects.count()
+        assert "notes_note" in lookups[0]["plan"]
+        views = {entry["view"] for entry in slow_query_log.recent()}
+        assert views == {"-", "api:receipt_detail"}
+
+    @staticmethod
+    def test_plans_are_bounded_by_the_log():
+        log = SlowQueryLog(2)
+        for table in ("notes_note", "notes_noteposition", "notes_note"):
+            log.record(connection, f"SELECT 1 FROM {table}", (), False, 1, "-")
+        assert set(log.plans) == {
+            "SELECT ? FROM notes_noteposition",
+            "SELECT ? FROM notes_note",
+        }
+        log.record(connection, "SELECT 1 FROM notes_note", (), False, 1, "-")
+        assert list(log.plans) == ["SELECT ? FROM notes_note"]
+        assert "notes_note" in log.plans["SELECT ? FROM notes_note"]
+
+    @staticmethod
+    def test_fast_queries_are_not_logged(worker_1):
+        worker_1.get("/bills/receipts/")
+        assert slow_query_log.recent() == []
+
+    @staticmethod
+    def test_endpoint_is_admin_only(settings, worker_1):
+        settings.SLOW_QUERY_THRESHOLD_MS = 0
+        worker_1.get("/bills/receipts/")
+        user = User.objects.get(username="luca_brasi")
+        user.is_staff = False
+        user.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        assert client.get("/metrics/slow-queries/").status_code == 403
+        response = worker_1.get("/metrics/slow-queries/?limit=2")
+        assert response.status_code == 200
+        assert response.data["threshold_ms"] == 0
+        assert len(response.data["top"]) == 2
+        assert len(response.data["recent"]) == 2
+
+    @staticmethod
+    def test_command_lists_top_offenders():
+        out = io.StringIO()
+        call_command(
+            "slow_queries",
+            "/bills/export/",
+            "/bills/receipts/",
+            user="tom_hagen",
+            plans=True,
+            stdout=out,
+        )
+        output = out.getvalue()
+        assert "GET /bills/export/: 200" in output
+        assert "GET /bills/receipts/: 200" in output
+        assert "views api:export_list" in output
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    """Enables profiling with PROFILE_ROOT in a temporary directory."""
+
+    settings.PROFILING_TOKEN = "secret"
+    settings.PROFILE_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    @staticmethod
+    def test_request_is_profiled(profiling, worker_1):
+        response = worker_1.get("/bills/receipts/", HTTP_X_PROFILE="secret")
+        assert response.status_code == 200
+        profile_id = response["X-Profile-Id"]
+        stats = pstats.Stats(str(profiling / f"{profile_id}.prof"))
+        assert stats.total_calls > 0
+        timeline = json.loads((profiling / f"{profile_id}.json").read_text())
+        assert timeline["view"] == "api:receipt_list"
+        assert timeline["status"] == 200
+        assert timeline["queries"]
+        starts = [query["start_ms"] for query in timeline["queries"]]
+        assert starts == sorted(starts)
+
+    @staticmethod
+    def test_streamed_response_is_profiled_when_sent(profiling, client):
+        response = client.get("/bills/export/?profile=secret")
+        profile_id = response["X-Profile-Id"]
+        assert not (profiling / f"{profile_id}.json").exists()
+        b"".join(response.streaming_content)
+        timeline = json.loads((profiling / f"{profile_id}.json").read_text())
+        assert timeline["view"] == "api:export_list"
+        assert any("notes_noteposition" in q["sql"] for q in timeline["queries"])
+
+    @staticmethod
+    def test_requests_without_the_token_are_not_profiled(profiling, worker_1):
+        assert not worker_1.get("/bills/receipts/").has_header("X-Profile-Id")
+        response = worker_1.get("/bills/receipts/", HTTP_X_PROFILE="wrong")
+        assert not response.has_header("X-Profile-Id")
+        response = worker_1.get("/bills/receipts/?profile=sécret")
+        assert response.status_code == 200
+        assert not response.has_header("X-Profile-Id")
+        assert list(profiling.iterdir()) == []
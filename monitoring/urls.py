@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = "monitoring"
+
+urlpatterns = [
+    path("", views.metrics, name="metrics"),
+    path("slow-queries/", views.SlowQueryView.as_view(), name="slow_queries"),
+]
@@ -0,0 +1,44 @@
+from accounts.authentication import (
+    CachedBasicAuthentication,
+    CachedTokenAuthentication,
+)
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import registry
+from .slow_queries import slow_query_log
+
+
+def metrics(request):
+    """Exposes the metrics of this process for Prometheus."""
+
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+class SlowQueryView(APIView):
+    """
+    Returns the queries of the slow query log of this process
+    with the most total time, and the latest logged queries.
+    """
+
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 20))
+        except ValueError:
+            raise ValidationError({"limit": "A valid integer is required."})
+        return Response(
+            {
+                "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+                "top": slow_query_log.top(limit),
+                "recent": slow_query_log.recent(limit),
+            }
+        )
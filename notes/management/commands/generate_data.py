@@ -0,0 +1,391 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from accounts.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from notes.models import Contractor, Note, NotePosition, Shop, Store
+from products.models import Category, Manufacturer, Product
+from stock.models import Stock
+from storage_manager_api.loader import indexes_deferred, insert_rows
+from workers.models import Worker
+
+NOTE_FIELDS = (
+    "id",
+    "type",
+    "handover_type",
+    "number",
+    "created",
+    "updated",
+    "from_store",
+    "from_shop",
+    "from_contractor",
+    "to_store",
+    "to_shop",
+    "to_contractor",
+    "worker",
+    "value_net",
+    "tax_value",
+    "value_gross",
+)
+POSITION_FIELDS = (
+    "note",
+    "product",
+    "quantity",
+    "price_net",
+    "tax_rate",
+    "discount_value",
+    "value_net",
+    "tax_value",
+    "value_gross",
+)
+PRODUCT_FIELDS = (
+    "id",
+    "name",
+    "group",
+    "code",
+    "batch_number",
+    "unit",
+    "purchase_price",
+    "sales_price_net",
+    "tax_rate",
+    "best_before_date",
+    "description",
+    "created",
+    "updated",
+    "manufacturer",
+    "category",
+)
+
+ROUTES = {
+    ("order", "external"): ("supplier", "location"),
+    ("supply", "external"): ("supplier", "location"),
+    ("supply", "internal"): ("store", "shop"),
+    ("dispatch", "internal"): ("store", "shop"),
+    ("dispatch", "external"): ("location", "client"),
+    ("return", "external"): ("client", "location"),
+    ("return", "internal"): ("shop", "store"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a consistent dataset of products, locations, contractors "
+        "and notes with positions of the given size. Notes, positions "
+        "and products are inserted in chunks, bypassing the ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=1000000)
+        parser.add_argument(
+            "--positions", type=int, default=10, help="Average positions per note."
+        )
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--locations", type=int, default=1000)
+        parser.add_argument("--contractors", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=50)
+        parser.add_argument(
+            "--days", type=int, default=365, help="Period covered by the notes."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--skip-stock",
+            action="store_true",
+            help="Do not rebuild stock, supply times and sales rollups from the notes.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.random = self.rng.random
+        self.chunk_size = options["chunk_size"]
+        start = time.perf_counter()
+        with transaction.atomic():
+            rows = self.create_products(options["products"])
+            rows += self.create_people(options["contractors"], options["workers"])
+            rows += self.create_locations(options["locations"])
+        # Generated rows reference existing rows only, so foreign keys
+        # are not checked and indexes are built once, after loading.
+        with connection.constraint_checks_disabled(), indexes_deferred(
+            Note, NotePosition
+        ):
+            notes, positions = self.load_notes(
+                options["notes"], options["positions"], options["days"]
+            )
+        rows += notes + positions
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Loaded {notes} notes with {positions} positions, "
+            f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)."
+        )
+        if options["skip_stock"]:
+            return
+        call_command("rebuild_stock", chunk_size=self.chunk_size, stdout=self.stdout)
+        call_command(
+            "backfill_supply_times", chunk_size=self.chunk_size, stdout=self.stdout
+        )
+        call_command("rebuild_reports", chunk_size=self.chunk_size, stdout=self.stdout)
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.chunk_size)
+        return len(objects)
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+    def create_products(self, count):
+        """Creates Products with their Manufacturers and Categories."""
+
+        first_manufacturer = self.next_id(Manufacturer)
+        manufacturers = [
+            Manufacturer(id=first_manufacturer + i, name=f"Manufacturer {i}")
+            for i in range(max(count // 50, 1))
+        ]
+        first_category = self.next_id(Category)
+        categories = [
+            Category(id=first_category + i, name=f"Category {i}") for i in range(20)
+        ]
+        first_product = self.next_id(Product)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows, self.products = [], []
+        for i in range(count):
+            purchase_price = self.rng.randint(50, 50000)
+            sales_price = round(purchase_price * self.rng.randint(110, 200) / 100)
+            tax_rate = self.rng.choice((5, 8, 23))
+            self.products.append(
+                (first_product + i, purchase_price, sales_price, tax_rate)
+            )
+            rows.append(
+                (
+                    first_product + i,
+                    f"Product {i}",
+                    self.rng.choice(Product.GROUP_CHOICES)[0],
+                    f"GEN{first_product + i:08d}",
+                    f"{self.rng.randint(1, 12):02d}.2021",
+                    "pc.",
+                    purchase_price / 100,
+                    sales_price / 100,
+                    tax_rate,
+                    date(2022, 1, 1) + timedelta(days=self.rng.randint(0, 730)),
+                    "",
+                    now,
+                    now,
+                    self.rng.choice(manufacturers).id,
+                    self.rng.choice(categories).id,
+                )
+            )
+        return (
+            self.bulk_create(Manufacturer, manufacturers)
+            + self.bulk_create(Category, categories)
+            + insert_rows(Product, PRODUCT_FIELDS, rows, self.chunk_size)
+        )
+
+    def create_people(self, contractors_count, workers_count):
+        """Creates Users of Contractors, half of them suppliers, and Workers."""
+
+        first_user = self.next_id(User)
+        users = [
+            User(
+                id=first_user + i,
+                username=f"user-{first_user + i}",
+                first_name="First",
+                last_name=f"Last {i}",
+                email=f"user-{first_user + i}@example.com",
+            )
+            for i in range(contractors_count + workers_count)
+        ]
+        first_contractor = self.next_id(Contractor)
+        contractors = [
+            Contractor(
+                id=first_contractor + i,
+                type="supplier" if i % 2 else "client",
+                company_name=f"Company {i}" if i % 2 else "",
+                address=f"Street {i}",
+                postal_code="00-001",
+                city="Warsaw",
+                user_id=users[i].id,
+            )
+            for i in range(contractors_count)
+        ]
+        first_worker = self.next_id(Worker)
+        workers = [
+            Worker(
+                id=first_worker + i,
+                position=self.rng.choice(("seller", "storeman")),
+                user_id=users[contractors_count + i].id,
+            )
+            for i in range(workers_count)
+        ]
+        self.suppliers = [c.id for c in contractors if c.type == "supplier"]
+        self.clients = [c.id for c in contractors if c.type == "client"]
+        self.workers = [worker.id for worker in workers]
+        return (
+            self.bulk_create(User, users)
+            + self.bulk_create(Contractor, contractors)
+            + self.bulk_create(Worker, workers)
+        )
+
+    def create_locations(self, count):
+        """Creates Stores and Shops, one in five being a Store, with Stocks."""
+
+        first_stock = self.next_id(Stock)
+        stocks = [Stock(id=first_stock + i) for i in range(count)]
+        stores_count = max(count // 5, 1)
+        first_store, first_shop = self.next_id(Store), self.next_id(Shop)
+        stores = [
+            Store(
+                id=first_store + i,
+                name=f"Store-{i}",
+                address=f"Street {i}",
+                postal_code="00-001",
+                city="Warsaw",
+                stock_id=stocks[i].id,
+            )
+            for i in range(stores_count)
+        ]
+        shops = [
+            Shop(
+                id=first_shop + i,
+                name=f"Shop-{i}",
+                address=f"Street {i}",
+                postal_code="00-001",
+                city="Warsaw",
+                stock_id=stocks[stores_count + i].id,
+            )
+            for i in range(count - stores_count)
+        ]
+        self.stores = [store.id for store in stores]
+        self.shops = [shop.id for shop in shops]
+        return (
+            self.bulk_create(Stock, stocks)
+            + self.bulk_create(Store, stores)
+            + self.bulk_create(Shop, shops)
+        )
+
+    def pick(self, items):
+        """Returns a random item, cheaper than Random.choice()."""
+
+        return items[int(self.random() * len(items))]
+
+    def endpoint(self, kind):
+        """Returns field values of a random 'from' or 'to' entity of a kind."""
+
+        if kind == "location":
+            kind = "store" if self.random() < 0.2 or not self.shops else "shop"
+        if kind == "store":
+            return "store", self.pick(self.stores)
+        if kind == "shop":
+            return "shop", self.pick(self.shops or self.stores)
+        contractors = self.suppliers if kind == "supplier" else self.clients
+        return "contractor", self.pick(contractors)
+
+    def load_notes(self, count, positions, days):
+        """
+        Inserts generated Notes and their positions in chunks of Notes.
+        Returns numbers of inserted Notes and positions.
+        """
+
+        first_note = self.next_id(Note)
+        # Dates are stored as naive UTC datetimes in SQLite.
+        end = datetime.fromisoformat(
+            connection.ops.adapt_datetimefield_value(timezone.now())
+        )
+        notes = self.generate_notes(first_note, end, count, positions, days)
+        loaded = [0, 0]
+        while True:
+            chunk = list(islice(notes, self.chunk_size))
+            if not chunk:
+                return tuple(loaded)
+            note_positions = [position for _, rows in chunk for position in rows]
+            with transaction.atomic():
+                loaded[0] += insert_rows(
+                    Note, NOTE_FIELDS, [note for note, _ in chunk], len(chunk)
+                )
+                loaded[1] += insert_rows(
+                    NotePosition, POSITION_FIELDS, note_positions, len(note_positions)
+                )
+
+    def generate_notes(self, first_note, end, count, positions, days):
+        """
+        Yields rows of Notes created in order over the given number of days
+        with rows of their positions of distinct Products, a duplicate drawn
+        for a Note being skipped. Values are
+        calculated in cents and rounded as NotePosition and ingest_note do,
+        then passed as numbers like values of DecimalFields in SQLite.
+        """
+
+        step = timedelta(days=days) / max(count, 1)
+        routes = list(ROUTES)
+        random = self.rng.random
+        products_count = len(self.products)
+        for i in range(count):
+            note_id = first_note + i
+            note_type, handover_type = self.pick(routes)
+            source, target = ROUTES[note_type, handover_type]
+            entities = {}
+            for side, kind in (("from", source), ("to", target)):
+                entity, entity_id = self.endpoint(kind)
+                entities[f"{side}_{entity}"] = entity_id
+            size = int(random() * (2 * positions - 1)) + 1
+            products = {
+                self.products[int(random() * products_count)]: None for _ in range(size)
+            }
+            net_total = tax_total = gross_total = 0
+            if handover_type == "external":
+                buying = note_type in ("order", "supply")
+                rows = []
+                for product_id, purchase_price, sales_price, tax_rate in products:
+                    quantity = int(random() * 100) + 1
+                    price = purchase_price if buying else sales_price
+                    value_net = price * quantity
+                    # round() rounds half to even as Decimal does, and halves
+                    # of cents are exact in floating point.
+                    tax_value = round(value_net * tax_rate / 100)
+                    value_gross = round(value_net * (100 + tax_rate) / 100)
+                    net_total += value_net
+                    tax_total += tax_value
+                    gross_total += value_gross
+                    rows.append(
+                        (
+                            note_id,
+                            product_id,
+                            quantity,
+                            price / 100,
+                            tax_rate,
+                            0,
+                            value_net / 100,
+                            tax_value / 100,
+                            value_gross / 100,
+                        )
+                    )
+            else:
+                rows = [
+                    (note_id, product[0], int(random() * 100) + 1, 0, 0, 0, 0, 0, 0)
+                    for product in products
+                ]
+            created = str(end - step * (count - i))
+            note = (
+                note_id,
+                note_type,
+                handover_type,
+                f"{handover_type[:3].upper()}-{note_type[:3].upper()}-{note_id}",
+                created,
+                created,
+                entities.get("from_store"),
+                entities.get("from_shop"),
+                entities.get("from_contractor"),
+                entities.get("to_store"),
+                entities.get("to_shop"),
+                entities.get("to_contractor"),
+                self.pick(self.workers),
+                net_total / 100,
+                tax_total / 100,
+                gross_total / 100,
+            )
+            yield note, rows
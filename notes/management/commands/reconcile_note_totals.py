@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+from django.db.models.functions import Abs
+from notes.models import Note
+
+FIELDS = ("value_net", "tax_value", "value_gross")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculates value_net, tax_value and value_gross of Notes "
+        "which differ from sums of their positions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count Notes with drifted totals.",
+        )
+
+    def handle(self, *args, chunk_size, dry_run, **options):
+        bounds = Note.objects.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            return
+        drifted = Q()
+        for field in FIELDS:
+            drifted |= Q(**{f"{field}_drift__gte": 0.005})
+        totals = Note.position_totals()
+        fixed = 0
+        for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+            notes = (
+                Note.objects.filter(id__gte=start, id__lt=start + chunk_size)
+                .annotate(**{f"{field}_sum": totals[field] for field in FIELDS})
+                .annotate(
+                    **{
+                        f"{field}_drift": Abs(F(field) - F(f"{field}_sum"))
+                        for field in FIELDS
+                    }
+                )
+                .filter(drifted)
+            )
+            with transaction.atomic():
+                if dry_run:
+                    count = notes.count()
+                else:
+                    count = Note.objects.filter(id__in=notes.values("id")).update(
+                        **totals
+                    )
+            fixed += count
+        verb = "would be fixed" if dry_run else "fixed"
+        self.stdout.write(f"Totals of {fixed} notes {verb}.")
@@ -1,11 +1,45 @@
 from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import Coalesce
 from products.models import Product
 from stock.models import Stock
 from workers.models import Worker
 from accounts.models import User
 
+from .signals import positions_posted, positions_reversed
+
+CENT = Decimal("0.01")
+
+# Fields of Notes and NotePositions which postings of positions depend on.
+NOTE_POSTING_FIELDS = (
+    "type",
+    "handover_type",
+    "created",
+    "from_store_id",
+    "from_shop_id",
+    "from_contractor_id",
+    "to_store_id",
+    "to_shop_id",
+    "to_contractor_id",
+    "worker_id",
+)
+POSITION_POSTING_FIELDS = (
+    "note_id",
+    "product_id",
+    "quantity",
+    "price_net",
+    "value_net",
+    "tax_value",
+)
+
+
+def posting_changed(previous, current, fields):
+    return any(getattr(previous, field) != getattr(current, field) for field in fields)
+
 
 class Store(models.Model):
     """
@@ -78,7 +112,7 @@ class Note(models.Model):
     )
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     handover_type = models.CharField(max_length=10, choices=HANDOVER_TYPE_CHOICES)
-    number = models.CharField(max_length=20, db_index=True)
+    number = models.CharField(max_length=20, unique=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     from_store = models.ForeignKey(
@@ -124,9 +158,75 @@ class Note(models.Model):
     tax_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     value_gross = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [models.Index(fields=["type", "handover_type", "created"])]
+
     def __str__(self):
         return f"<Note: {self.number}>"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = Note.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            if previous is None or not posting_changed(
+                previous, self, NOTE_POSTING_FIELDS
+            ):
+                return
+            positions = list(self.positions.all())
+            if positions:
+                positions_reversed.send(sender=Note, note=previous, positions=positions)
+                positions_posted.send(
+                    sender=Note, note=self, positions=positions, reposted=True
+                )
+
+    @staticmethod
+    def position_totals():
+        """
+        Returns expressions calculating value_net, tax_value and value_gross
+        of a Note as sums of values of its NotePositions.
+        """
+
+        positions = NotePosition.objects.filter(note=OuterRef("pk")).values("note")
+        return {
+            field: Coalesce(
+                Subquery(
+                    positions.annotate(total=Sum(field)).values("total"),
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                ),
+                Value(0),
+            )
+            for field in ("value_net", "tax_value", "value_gross")
+        }
+
+    def stock_changes(self):
+        """
+        Returns (stock_id, sign) pairs of Stocks changed by the Note.
+        Products leave the Stock of the 'from' entity and enter the Stock
+        of the 'to' entity. Orders do not change any Stock.
+        """
+
+        if self.type == "order":
+            return []
+        changes = []
+        for store, shop, sign in (
+            ("from_store", "from_shop", -1),
+            ("to_store", "to_shop", 1),
+        ):
+            entity = getattr(self, store) or getattr(self, shop)
+            if entity:
+                changes.append((entity.stock_id, sign))
+        return changes
+
+    def recalculate_values(self):
+        """
+        Recalculates value_net, tax_value and value_gross
+        from NotePositions in a single UPDATE.
+        """
+
+        Note.objects.filter(pk=self.pk).update(**self.position_totals())
+
 
 class NotePosition(models.Model):
     """
@@ -150,10 +250,46 @@ class NotePosition(models.Model):
         return f"<NotePosition: {self.product}>"
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         if self.price_net:
             self.calculate_position_values()
-            self.calculate_note_values()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = (
+                None
+                if adding
+                else NotePosition.objects.select_related("note")
+                .filter(pk=self.pk)
+                .first()
+            )
+            super().save(*args, **kwargs)
+            if previous is None:
+                self.calculate_note_values()
+                positions_posted.send(
+                    sender=NotePosition, note=self.note, positions=[self]
+                )
+            else:
+                self.note.recalculate_values()
+                if previous.note_id != self.note_id:
+                    previous.note.recalculate_values()
+                if posting_changed(previous, self, POSITION_POSTING_FIELDS):
+                    self.repost(previous)
+            if NotePosition.note.is_cached(self):
+                self.note.refresh_from_db(
+                    fields=["value_net", "tax_value", "value_gross"]
+                )
+
+    def repost(self, previous):
+        """
+        Reverses postings of the previous values of the position
+        and posts its current values.
+        """
+
+        positions_reversed.send(
+            sender=NotePosition, note=previous.note, positions=[previous]
+        )
+        positions_posted.send(
+            sender=NotePosition, note=self.note, positions=[self], reposted=True
+        )
 
     def calculate_position_values(self):
         """
@@ -165,21 +301,32 @@ class NotePosition(models.Model):
         self.tax_value = self.value_net * Decimal(self.tax_rate) / 100
         self.value_gross = self.value_net + self.tax_value
 
-    def calculate_note_values(self):
+    def calculate_note_values(self, sign=1):
         """
-        Updates value_net, tax_value and value_gross in related Note.
+        Adds value_net, tax_value and value_gross to the related Note,
+        or subtracts them with a negative sign, with an atomic UPDATE,
+        so concurrent writers do not lose updates.
+        Values are rounded as they are stored in NotePosition.
         """
 
-        value_net = Decimal(self.note.value_net)
-        value_net += Decimal(self.value_net)
-        self.note.value_net = value_net
+        if not self.price_net:
+            return
+        Note.objects.filter(pk=self.note_id).update(
+            **{
+                field: F(field) + sign * Decimal(getattr(self, field)).quantize(CENT)
+                for field in ("value_net", "tax_value", "value_gross")
+            }
+        )
 
-        tax_value = Decimal(self.note.tax_value)
-        tax_value += Decimal(self.tax_value)
-        self.note.tax_value = tax_value
 
-        value_gross = Decimal(self.note.value_gross)
-        value_gross += Decimal(self.value_gross)
-        self.note.value_gross = value_gross
+@receiver(post_delete, sender=NotePosition)
+def reverse_deleted_position(sender, instance, **kwargs):
+    """
+    Subtracts values of a deleted position from its Note and reverses
+    its postings, in the transaction deleting it.
+    """
 
-        self.note.save()
+    instance.calculate_note_values(sign=-1)
+    positions_reversed.send(
+        sender=NotePosition, note=instance.note, positions=[instance]
+    )
@@ -0,0 +1,23 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON into a list of objects, one per line.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            return [
+                json.loads(line.decode(encoding)) for line in stream if line.strip()
+            ]
+        except ValueError as exc:
+            raise ParseError(f"NDJSON parse error - {exc}")
@@ -0,0 +1,83 @@
+from products.models import Product
+from rest_framework import serializers
+
+from .models import Note, NotePosition
+from .services import ingest_note
+
+
+class NotePositionIngestSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField()
+
+    class Meta:
+        model = NotePosition
+        fields = [
+            "product_id",
+            "quantity",
+            "price_net",
+            "tax_rate",
+            "discount_value",
+        ]
+
+
+class NoteIngestListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        """
+        Reports Notes numbered as an earlier Note of the batch,
+        as the unique validator of number only checks saved Notes.
+        """
+
+        notes = super().to_internal_value(data)
+        seen = set()
+        errors = []
+        for note in notes:
+            number = note["number"]
+            errors.append(
+                {"number": ["Note given more than once."]} if number in seen else {}
+            )
+            seen.add(number)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return notes
+
+
+class NoteIngestSerializer(serializers.ModelSerializer):
+    positions = NotePositionIngestSerializer(many=True)
+
+    class Meta:
+        model = Note
+        list_serializer_class = NoteIngestListSerializer
+        fields = [
+            "type",
+            "handover_type",
+            "number",
+            "from_store",
+            "from_shop",
+            "from_contractor",
+            "to_store",
+            "to_shop",
+            "to_contractor",
+            "worker",
+            "positions",
+        ]
+
+    def validate_positions(self, positions):
+        product_ids = {position["product_id"] for position in positions}
+        found = set(
+            Product.objects.filter(id__in=product_ids).values_list("id", flat=True)
+        )
+        if product_ids - found:
+            raise serializers.ValidationError(
+                f"Products not found: {sorted(product_ids - found)}"
+            )
+        return positions
+
+    def create(self, validated_data):
+        return ingest_note(validated_data)
+
+    def to_representation(self, instance):
+        return {
+            "number": instance.number,
+            "value_net": str(instance.value_net),
+            "tax_value": str(instance.tax_value),
+            "value_gross": str(instance.value_gross),
+        }
@@ -0,0 +1,78 @@
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+
+from .models import CENT, Note, NotePosition
+from .signals import positions_posted
+
+
+def ingest_note(data, batch_size=1000):
+    """
+    Creates a Note with all its positions.
+    Position values are calculated in memory, the Note is written once
+    with its totals and positions are added with bulk inserts.
+    """
+
+    positions_data = data.pop("positions")
+    note = Note(**data)
+    positions = [NotePosition(**position) for position in positions_data]
+    for position in positions:
+        if position.price_net:
+            position.calculate_position_values()
+            add_position_values(note, position)
+    with transaction.atomic():
+        note.save()
+        for position in positions:
+            position.note = note
+        NotePosition.objects.bulk_create(positions, batch_size=batch_size)
+        positions_posted.send(sender=NotePosition, note=note, positions=positions)
+    return note
+
+
+def load_notes(notes, chunk_size=5000, send_signals=True):
+    """
+    Loads (Note, positions) pairs with chunked bulk inserts.
+    Notes need their ids set, as SQLite does not return ids of bulk
+    inserted rows. Values of positions and totals of Notes are calculated
+    in memory. Without signals the stock ledger is left to be rebuilt
+    once after loading.
+    Returns numbers of loaded Notes and positions.
+    """
+
+    notes = iter(notes)
+    loaded = [0, 0]
+    while True:
+        chunk = list(islice(notes, chunk_size))
+        if not chunk:
+            return tuple(loaded)
+        for note, positions in chunk:
+            for position in positions:
+                position.note = note
+                if position.price_net:
+                    position.calculate_position_values()
+                    add_position_values(note, position)
+        positions = [
+            position for _, note_positions in chunk for position in note_positions
+        ]
+        with transaction.atomic():
+            Note.objects.bulk_create([note for note, _ in chunk])
+            NotePosition.objects.bulk_create(positions, batch_size=chunk_size)
+            if send_signals:
+                for note, note_positions in chunk:
+                    positions_posted.send(
+                        sender=NotePosition, note=note, positions=note_positions
+                    )
+        loaded[0] += len(chunk)
+        loaded[1] += len(positions)
+
+
+def add_position_values(note, position):
+    """
+    Adds values of the position, rounded as they are stored,
+    to totals of the Note.
+    """
+
+    for field in ("value_net", "tax_value", "value_gross"):
+        value = Decimal(getattr(position, field)).quantize(CENT)
+        setattr(note, field, Decimal(getattr(note, field)) + value)
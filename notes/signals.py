@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent with `note` and a list of its new `positions`
+# when positions are added to a Note, and with `reposted=True`
+# after positions or their Note are changed, following positions_reversed.
+positions_posted = Signal()
+
+# Sent with `note` and a list of `positions` with their previous values
+# when positions are deleted, or before positions or their Note are changed.
+positions_reversed = Signal()
@@ -1,3 +1,227 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+import pytest
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from notes.models import Note, NotePosition
+from stock.models import StockMovement
+
+NOTE = {
+    "type": "dispatch",
+    "handover_type": "external",
+    "from_shop": 1,
+    "to_contractor": 2,
+    "worker": 1,
+}
+
+
+def positions(count):
+    return [
+        {
+            "product_id": 1 + i % 4,
+            "quantity": "3.00",
+            "price_net": "10.15",
+            "tax_rate": 23,
+            "discount_value": "0.10" if i % 2 else "0.00",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+class TestIngestion:
+    @staticmethod
+    def test_ingest_view(worker_1, django_assert_max_num_queries):
+        data = dict(NOTE, number="EXT-DIS-2", positions=positions(50))
+        # Stock movements and sales rollups are posted with the Note.
+        with django_assert_max_num_queries(21):
+            response = worker_1.post("/notes/ingest/", data, format="json")
+        assert response.status_code == 200
+        note = Note.objects.get(number="EXT-DIS-2")
+        assert note.positions.count() == 50
+
+        saved = Note(
+            type="dispatch",
+            handover_type="external",
+            number="EXT-DIS-3",
+            from_shop_id=1,
+            to_contractor_id=2,
+            worker_id=1,
+        )
+        saved.save()
+        for position in positions(50):
+            NotePosition(note_id=saved.id, **position).save()
+        saved.refresh_from_db()
+        assert note.value_net == saved.value_net == Decimal("1515.00")
+        assert note.tax_value == saved.tax_value
+        assert note.value_gross == saved.value_gross
+        assert list(note.positions.values_list("value_gross", flat=True)) == list(
+            saved.positions.values_list("value_gross", flat=True)
+        )
+
+    @staticmethod
+    def test_ingest_view_ndjson(worker_1):
+        lines = [
+            json.dumps(dict(NOTE, number=f"EXT-DIS-{i}", positions=positions(3)))
+            for i in (2, 3)
+        ]
+        response = worker_1.post(
+            "/notes/ingest/",
+            "\n".join(lines),
+            content_type="application/x-ndjson",
+        )
+        assert response.status_code == 200
+        assert [note["number"] for note in response.data["created"]] == [
+            "EXT-DIS-2",
+            "EXT-DIS-3",
+        ]
+        assert NotePosition.objects.filter(note__number="EXT-DIS-3").count() == 3
+
+    @staticmethod
+    def test_ingest_view_duplicate_numbers(worker_1):
+        lines = [
+            json.dumps(dict(NOTE, number=f"EXT-DIS-{i}", positions=positions(1)))
+            for i in (2, 3, 2)
+        ]
+        response = worker_1.post(
+            "/notes/ingest/",
+            "\n".join(lines),
+            content_type="application/x-ndjson",
+        )
+        assert response.status_code == 400
+        assert response.data == [{}, {}, {"number": ["Note given more than once."]}]
+        assert not Note.objects.filter(number__in=["EXT-DIS-2", "EXT-DIS-3"]).exists()
+
+    @staticmethod
+    def test_ingest_view_unknown_product(worker_1):
+        data = dict(NOTE, number="EXT-DIS-2", positions=positions(1))
+        data["positions"][0]["product_id"] = 100
+        response = worker_1.post("/notes/ingest/", data, format="json")
+        assert response.status_code == 400
+        assert not Note.objects.filter(number="EXT-DIS-2").exists()
+
+
+@pytest.mark.django_db
+class TestNoteValues:
+    @staticmethod
+    def test_update_position():
+        position = NotePosition.objects.filter(note__number="EXT-DIS-1").first()
+        position.quantity = 4
+        position.save()
+        note = Note.objects.get(number="EXT-DIS-1")
+        assert note.value_net == Decimal("115.90")
+        assert note.tax_value == Decimal("26.65")
+        assert note.value_gross == Decimal("142.55")
+
+    @staticmethod
+    def test_delete_position():
+        position = NotePosition.objects.filter(note__number="EXT-DIS-1").first()
+        position.delete()
+        note = Note.objects.get(number="EXT-DIS-1")
+        assert note.value_net == Decimal("95.70") - position.value_net
+        assert note.value_gross == Decimal("117.71") - position.value_gross
+        NotePosition.objects.filter(note=note).delete()
+        note.refresh_from_db()
+        assert note.value_net == note.tax_value == note.value_gross == 0
+
+    @staticmethod
+    def test_reconcile_note_totals():
+        Note.objects.filter(number__in=["EXT-SUP-1", "EXT-DIS-1"]).update(value_net=1)
+        out = StringIO()
+        call_command("reconcile_note_totals", "--chunk-size=2", stdout=out)
+        assert out.getvalue() == "Totals of 2 notes fixed.\n"
+        assert Note.objects.get(number="EXT-DIS-1").value_net == Decimal("95.70")
+        assert Note.objects.get(number="EXT-SUP-1").value_net == Decimal("24200.00")
+        out = StringIO()
+        call_command("reconcile_note_totals", "--dry-run", stdout=out)
+        assert out.getvalue() == "Totals of 0 notes would be fixed.\n"
+
+
+@pytest.mark.django_db
+class TestGenerateData:
+    @staticmethod
+    def generate(seed):
+        call_command(
+            "generate_data",
+            "--notes=200",
+            "--products=50",
+            "--locations=10",
+            "--contractors=10",
+            "--workers=2",
+            "--chunk-size=64",
+            f"--seed={seed}",
+            stdout=StringIO(),
+        )
+        return list(
+            Note.objects.filter(id__gt=3)
+            .order_by("id")
+            .values_list("type", "handover_type", "value_gross")
+        )
+
+    def test_generate_data(self):
+        notes = self.generate(seed=1)
+        assert len(notes) == 200
+        assert NotePosition.objects.filter(note_id__gt=3).count() >= 200
+        assert not NotePosition.objects.filter(note__type="order").exclude(
+            note__from_contractor__type="supplier"
+        )
+        out = StringIO()
+        call_command("reconcile_note_totals", "--dry-run", stdout=out)
+        assert out.getvalue() == "Totals of 0 notes would be fixed.\n"
+        assert StockMovement.objects.filter(note_id__gt=3).exists()
+
+        Note.objects.filter(id__gt=3).delete()
+        assert self.generate(seed=1) == notes
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_positions():
+    """
+    Writers adding positions through their own, stale Note instances
+    must not lose each other's updates. Writers contend for the SQLite
+    write lock, waiting for it with busy_timeout and retrying saves
+    which still fail with "database is locked".
+    """
+
+    threads_count, positions_count = 4, 25
+    barrier = threading.Barrier(threads_count)
+    errors = []
+
+    def add_positions():
+        try:
+            note = Note.objects.get(number="EXT-DIS-1")
+            barrier.wait()
+            for _ in range(positions_count):
+                for attempt in range(100):
+                    try:
+                        NotePosition(
+                            note=note,
+                            product_id=3,
+                            quantity=1,
+                            price_net="1.00",
+                            tax_rate=23,
+                        ).save()
+                        break
+                    except OperationalError as e:
+                        if "locked" not in str(e):
+                            raise
+                        time.sleep(0.001)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=add_positions) for _ in range(threads_count)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert not errors
+    note = Note.objects.get(number="EXT-DIS-1")
+    assert note.positions.count() == 2 + threads_count * positions_count
+    assert note.value_net == Decimal("95.70") + threads_count * positions_count
+    assert note.value_gross == (
+        Decimal("117.71") + Decimal("1.23") * threads_count * positions_count
+    )
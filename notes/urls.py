@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = "notes"
+
+urlpatterns = [
+    path("ingest/", views.NoteIngestView.as_view(), name="note_ingest"),
+]
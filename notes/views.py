@@ -1,3 +1,26 @@
-from django.shortcuts import render
+from accounts.authentication import (
+    CachedBasicAuthentication,
+    CachedTokenAuthentication,
+)
+from bills.permissions import IsWorker
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .parsers import NDJSONParser
+from .serializers import NoteIngestSerializer
+
+
+class NoteIngestView(APIView):
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsWorker,)
+    parser_classes = (JSONParser, NDJSONParser)
+
+    def post(self, request):
+        many = isinstance(request.data, list)
+        serializer = NoteIngestSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response({"created": serializer.data})
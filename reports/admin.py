@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import SalesRollup
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = [
+        "period",
+        "period_start",
+        "dimension",
+        "key",
+        "revenue",
+        "tax",
+        "units",
+        "margin",
+    ]
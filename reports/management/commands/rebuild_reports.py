@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from notes.models import NotePosition
+from reports.models import SalesRollup
+from reports.services import SALE_VALUES, SALES_SIGNS, Sale, SalesTotals
+
+
+class Command(BaseCommand):
+    help = "Rebuilds sales rollups from positions of all external Notes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, chunk_size, **options):
+        positions = (
+            NotePosition.objects.filter(
+                note__type__in={note_type for note_type, _ in SALES_SIGNS},
+                note__handover_type="external",
+            )
+            .order_by("id")
+            .values_list(*SALE_VALUES)
+        )
+        totals, posted = SalesTotals(), 0
+        with transaction.atomic():
+            SalesRollup.objects.all().delete()
+            for values in positions.iterator(chunk_size=chunk_size):
+                totals.add(Sale(*values))
+                posted += 1
+                if len(totals) >= chunk_size:
+                    totals.save(chunk_size)
+            totals.save(chunk_size)
+        self.stdout.write(
+            f"Posted {posted} positions, {SalesRollup.objects.count()} rollups."
+        )
@@ -0,0 +1,47 @@
+from django.db import models
+
+
+class SalesRollup(models.Model):
+    """
+    Totals of sales of one day, week or month for a key of a dimension,
+    e.g. a Product, maintained as positions of external dispatch
+    and return Notes are posted. Returns count with negative values.
+    """
+
+    PERIOD_CHOICES = (
+        ("day", "Day"),
+        ("week", "Week"),
+        ("month", "Month"),
+    )
+    DIMENSION_CHOICES = (
+        ("total", "Total"),
+        ("store", "Store"),
+        ("shop", "Shop"),
+        ("product", "Product"),
+        ("category", "Category"),
+        ("manufacturer", "Manufacturer"),
+        ("contractor", "Contractor"),
+        ("worker", "Worker"),
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.IntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    margin = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "dimension", "period_start", "key"],
+                name="unique_sales_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"<SalesRollup: {self.dimension} {self.key} "
+            f"{self.period} {self.period_start}>"
+        )
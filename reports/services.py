@@ -0,0 +1,201 @@
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection
+from django.utils import timezone
+from notes.models import CENT
+from products.models import Product
+
+from .models import SalesRollup
+
+# Notes counted as sales, returns taking sales back.
+SALES_SIGNS = {("dispatch", "external"): 1, ("return", "external"): -1}
+
+METRICS = ("revenue", "tax", "units", "margin")
+
+PERIOD_STARTS = {
+    "day": lambda day: day,
+    "week": lambda day: day - timedelta(days=day.weekday()),
+    "month": lambda day: day.replace(day=1),
+}
+
+Sale = namedtuple(
+    "Sale",
+    [
+        "note_type",
+        "handover_type",
+        "created",
+        "from_store",
+        "from_shop",
+        "to_store",
+        "to_shop",
+        "from_contractor",
+        "to_contractor",
+        "worker",
+        "product",
+        "category",
+        "manufacturer",
+        "purchase_price",
+        "quantity",
+        "price_net",
+        "value_net",
+        "tax_value",
+    ],
+)
+
+# Values of NotePositions in the layout of Sale.
+SALE_VALUES = (
+    "note__type",
+    "note__handover_type",
+    "note__created",
+    "note__from_store_id",
+    "note__from_shop_id",
+    "note__to_store_id",
+    "note__to_shop_id",
+    "note__from_contractor_id",
+    "note__to_contractor_id",
+    "note__worker_id",
+    "product_id",
+    "product__category_id",
+    "product__manufacturer_id",
+    "product__purchase_price",
+    "quantity",
+    "price_net",
+    "value_net",
+    "tax_value",
+)
+
+
+class SalesTotals:
+    """
+    Sums of sales by period, dimension and key, added to SalesRollups
+    with upserts, so rollups are updated without reading them.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(lambda: [Decimal(0)] * len(METRICS))
+
+    def __len__(self):
+        return len(self.totals)
+
+    def add(self, sale, sign=1):
+        """Adds the sale, or subtracts it with a negative sign."""
+
+        direction = SALES_SIGNS.get((sale.note_type, sale.handover_type))
+        if direction is None:
+            return
+        quantity = Decimal(sale.quantity)
+        margin = (Decimal(sale.price_net) - Decimal(sale.purchase_price)) * quantity
+        sign *= direction
+        values = (
+            sign * Decimal(sale.value_net).quantize(CENT),
+            sign * Decimal(sale.tax_value).quantize(CENT),
+            sign * quantity,
+            sign * margin,
+        )
+        if direction > 0:
+            store, shop, contractor = (
+                sale.from_store,
+                sale.from_shop,
+                sale.to_contractor,
+            )
+        else:
+            store, shop, contractor = sale.to_store, sale.to_shop, sale.from_contractor
+        keys = (
+            ("total", 0),
+            ("store", store),
+            ("shop", shop),
+            ("product", sale.product),
+            ("category", sale.category),
+            ("manufacturer", sale.manufacturer),
+            ("contractor", contractor),
+            ("worker", sale.worker),
+        )
+        day = timezone.localdate(sale.created)
+        for period, start in PERIOD_STARTS.items():
+            period_start = start(day)
+            for dimension, key in keys:
+                if key is None:
+                    continue
+                totals = self.totals[period, period_start, dimension, key]
+                for i, value in enumerate(values):
+                    totals[i] += value
+
+    def save(self, chunk_size=5000):
+        """Adds the sums to SalesRollups and clears them."""
+
+        quote = connection.ops.quote_name
+        table = quote(SalesRollup._meta.db_table)
+        columns = ("period", "period_start", "dimension", "key", *METRICS)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(map(quote, columns))}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(map(quote, columns[:4]))}) DO UPDATE SET "
+            + ", ".join(
+                f"{quote(metric)} = {table}.{quote(metric)} + excluded.{quote(metric)}"
+                for metric in METRICS
+            )
+        )
+        rows = (
+            (
+                period,
+                connection.ops.adapt_datefield_value(period_start),
+                dimension,
+                key,
+                *(
+                    connection.ops.adapt_decimalfield_value(value.quantize(CENT))
+                    for value in values
+                ),
+            )
+            for (period, period_start, dimension, key), values in self.totals.items()
+        )
+        with connection.cursor() as cursor:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                cursor.executemany(sql, chunk)
+        self.totals.clear()
+
+
+def post_sales(note, positions, sign=1):
+    """
+    Adds sales of the new positions of an external dispatch
+    or return Note to SalesRollups, in the transaction posting them.
+    A negative sign subtracts sales of previous values of positions.
+    """
+
+    if (note.type, note.handover_type) not in SALES_SIGNS:
+        return
+    products = {
+        product_id: values
+        for product_id, *values in Product.objects.filter(
+            id__in={position.product_id for position in positions}
+        ).values_list("id", "category_id", "manufacturer_id", "purchase_price")
+    }
+    totals = SalesTotals()
+    for position in positions:
+        totals.add(
+            Sale(
+                note.type,
+                note.handover_type,
+                note.created,
+                note.from_store_id,
+                note.from_shop_id,
+                note.to_store_id,
+                note.to_shop_id,
+                note.from_contractor_id,
+                note.to_contractor_id,
+                note.worker_id,
+                position.product_id,
+                *products[position.product_id],
+                position.quantity,
+                position.price_net,
+                position.value_net,
+                position.tax_value,
+            ),
+            sign,
+        )
+    totals.save()
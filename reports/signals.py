@@ -0,0 +1,14 @@
+from django.dispatch import receiver
+from notes.signals import positions_posted, positions_reversed
+
+from .services import post_sales
+
+
+@receiver(positions_posted)
+def update_sales_rollups(sender, note, positions, **kwargs):
+    post_sales(note, positions)
+
+
+@receiver(positions_reversed)
+def reverse_sales_rollups(sender, note, positions, **kwargs):
+    post_sales(note, positions, sign=-1)
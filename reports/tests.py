@@ -0,0 +1,196 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from notes.models import Note, NotePosition
+from reports.models import SalesRollup
+
+
+def rollups(period="month", dimension="total"):
+    return {
+        rollup.key: (rollup.revenue, rollup.tax, rollup.units, rollup.margin)
+        for rollup in SalesRollup.objects.filter(period=period, dimension=dimension)
+    }
+
+
+def all_rollups():
+    """
+    Returns values of rollups which have any sales, as rebuilt ones.
+    Values are rounded, as SQLite adds decimals as floating point.
+    """
+
+    sales = []
+    for row in SalesRollup.objects.values_list(
+        "period",
+        "period_start",
+        "dimension",
+        "key",
+        "revenue",
+        "tax",
+        "units",
+        "margin",
+    ):
+        values = [Decimal(value).quantize(Decimal("0.01")) for value in row[4:]]
+        if any(values):
+            sales.append((*row[:4], *values))
+    return sorted(sales)
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    @staticmethod
+    def test_rollups_of_test_data():
+        total = (Decimal("95.70"), Decimal("22.01"), Decimal("7.00"), Decimal("26.70"))
+        for period in ("day", "week", "month"):
+            assert rollups(period) == {0: total}
+        assert rollups(dimension="product") == {
+            1: (Decimal("20.20"), Decimal("4.65"), Decimal("2.00"), Decimal("6.20")),
+            2: (Decimal("75.50"), Decimal("17.36"), Decimal("5.00"), Decimal("20.50")),
+        }
+        assert rollups(dimension="shop") == {1: total}
+        assert rollups(dimension="store") == {}
+        assert rollups(dimension="contractor") == {2: total}
+        assert rollups(dimension="worker") == {1: total}
+        assert rollups(dimension="category") == {1: total}
+        assert rollups(dimension="manufacturer") == {1: total}
+        week = SalesRollup.objects.get(period="week", dimension="total")
+        assert week.period_start.weekday() == 0
+
+    @staticmethod
+    def test_returns_take_sales_back():
+        note = Note(type="return", handover_type="external", number="EXT-RET-1")
+        note.from_contractor_id, note.to_shop_id, note.worker_id = 2, 1, 1
+        note.save()
+        NotePosition(
+            note=note, product_id=1, quantity=1, price_net="10.10", tax_rate=23
+        ).save()
+        assert rollups(dimension="product")[1] == (
+            Decimal("10.10"),
+            Decimal("2.33"),
+            Decimal("1.00"),
+            Decimal("3.10"),
+        )
+        assert rollups()[0][0] == Decimal("85.60")
+
+    @staticmethod
+    def test_other_notes_are_not_sales():
+        note = Note(type="dispatch", handover_type="internal", number="INT-DIS-2")
+        note.from_store_id, note.to_shop_id = 1, 1
+        note.save()
+        NotePosition(note=note, product_id=1, quantity=1).save()
+        assert rollups()[0][2] == Decimal("7.00")
+
+    @staticmethod
+    def test_rebuild_reports():
+        note = Note(type="dispatch", handover_type="external", number="EXT-DIS-2")
+        note.from_store_id, note.to_contractor_id, note.worker_id = 1, 2, 2
+        note.save()
+        for product_id in (1, 3):
+            NotePosition(
+                note=note, product_id=product_id, quantity=3, price_net="9.99"
+            ).save()
+        incremental = all_rollups()
+        SalesRollup.objects.update(revenue=0)
+        out = StringIO()
+        call_command("rebuild_reports", stdout=out)
+        assert all_rollups() == incremental
+        assert "Posted 4 positions" in out.getvalue()
+
+    @staticmethod
+    def assert_rollups_rebuilt():
+        incremental = all_rollups()
+        call_command("rebuild_reports", stdout=StringIO())
+        assert all_rollups() == incremental
+
+    def test_update_position(self):
+        position = NotePosition.objects.get(note__number="EXT-DIS-1", product_id=1)
+        position.quantity = 4
+        position.save()
+        assert rollups(dimension="product")[1] == (
+            Decimal("40.40"),
+            Decimal("9.29"),
+            Decimal("4.00"),
+            Decimal("12.40"),
+        )
+        assert rollups()[0][0] == Decimal("115.90")
+        self.assert_rollups_rebuilt()
+
+    def test_delete_position(self):
+        NotePosition.objects.get(note__number="EXT-DIS-1", product_id=2).delete()
+        assert rollups()[0][0] == Decimal("20.20")
+        self.assert_rollups_rebuilt()
+
+    def test_update_note(self):
+        note = Note.objects.get(number="EXT-DIS-1")
+        note.created -= timedelta(days=40)
+        note.to_contractor_id = 1
+        note.save()
+        sales = [row for row in all_rollups() if row[2] == "contractor"]
+        assert [row[3] for row in sales] == [1, 1, 1]
+        assert {row[0]: row[1] for row in sales}["day"] == timezone.localdate(
+            note.created
+        )
+        self.assert_rollups_rebuilt()
+
+    def test_delete_note(self):
+        Note.objects.get(number="EXT-DIS-1").delete()
+        assert all_rollups() == []
+
+
+@pytest.mark.django_db
+class TestSalesReportView:
+    @staticmethod
+    def test_report(worker_1):
+        today = timezone.localdate()
+        response = worker_1.get(
+            "/reports/sales/", {"period": "day", "group_by": "product"}
+        )
+        assert response.status_code == 200
+        assert response.data["results"] == [
+            {
+                "period_start": today,
+                "key": 1,
+                "revenue": Decimal("20.20"),
+                "tax": Decimal("4.65"),
+                "units": Decimal("2.00"),
+                "margin": Decimal("6.20"),
+            },
+            {
+                "period_start": today,
+                "key": 2,
+                "revenue": Decimal("75.50"),
+                "tax": Decimal("17.36"),
+                "units": Decimal("5.00"),
+                "margin": Decimal("20.50"),
+            },
+        ]
+        response = worker_1.get("/reports/sales/", {"group_by": "product", "key": 2})
+        assert [row["key"] for row in response.data["results"]] == [2]
+
+    @staticmethod
+    def test_date_range(worker_1):
+        today = timezone.localdate()
+        response = worker_1.get(
+            "/reports/sales/",
+            {"period": "month", "date_from": str(today), "date_to": str(today)},
+        )
+        assert response.data["date_from"] == today.replace(day=1)
+        assert len(response.data["results"]) == 1
+        response = worker_1.get(
+            "/reports/sales/", {"date_to": str(today - timedelta(days=40))}
+        )
+        assert response.data["results"] == []
+
+    @staticmethod
+    def test_invalid_params(worker_1, client):
+        for params in (
+            {"period": "year"},
+            {"group_by": "city"},
+            {"date_from": "2021-13-01"},
+            {"key": "a"},
+        ):
+            assert worker_1.get("/reports/sales/", params).status_code == 400
+        assert client.get("/reports/sales/").status_code == 401
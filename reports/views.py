@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from accounts.authentication import (
+    CachedBasicAuthentication,
+    CachedTokenAuthentication,
+)
+from bills.permissions import IsWorker
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import SalesRollup
+from .services import METRICS, PERIOD_STARTS
+
+
+def report_params(request):
+    """
+    Returns period, group_by, key and the date range given in the query
+    string. The range defaults to the last year and starts with the first
+    day of the period containing date_from.
+    """
+
+    params = request.query_params
+    period = params.get("period", "month")
+    if period not in PERIOD_STARTS:
+        raise ValidationError({"period": f"Choose one of {', '.join(PERIOD_STARTS)}."})
+    group_by = params.get("group_by", "total")
+    dimensions = [dimension for dimension, _ in SalesRollup.DIMENSION_CHOICES]
+    if group_by not in dimensions:
+        raise ValidationError({"group_by": f"Choose one of {', '.join(dimensions)}."})
+    dates = {}
+    for param, default in (
+        ("date_to", timezone.localdate()),
+        ("date_from", None),
+    ):
+        if param not in params:
+            dates[param] = default
+            continue
+        try:
+            dates[param] = parse_date(params[param])
+        except ValueError:
+            dates[param] = None
+        if dates[param] is None:
+            raise ValidationError({param: "A valid date is required."})
+    date_from = dates["date_from"] or dates["date_to"] - timedelta(days=365)
+    key = params.get("key")
+    if key is not None:
+        try:
+            key = int(key)
+        except ValueError:
+            raise ValidationError({"key": "A valid integer is required."})
+    return period, group_by, key, PERIOD_STARTS[period](date_from), dates["date_to"]
+
+
+class SalesReportView(APIView):
+    """
+    Returns revenue, tax, units and margin of sales by day, week or month,
+    in total or by store, shop, product, category, manufacturer, contractor
+    or worker, read from SalesRollups.
+    """
+
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsWorker,)
+
+    def get(self, request):
+        period, group_by, key, date_from, date_to = report_params(request)
+        rollups = SalesRollup.objects.filter(
+            period=period,
+            dimension=group_by,
+            period_start__gte=date_from,
+            period_start__lte=date_to,
+        )
+        if key is not None:
+            rollups = rollups.filter(key=key)
+        return Response(
+            {
+                "period": period,
+                "group_by": group_by,
+                "date_from": date_from,
+                "date_to": date_to,
+                "results": list(
+                    rollups.order_by("period_start", "key").values(
+                        "period_start", "key", *METRICS
+                    )
+                ),
+            }
+        )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Stock, StockPosition
+from .models import Stock, StockPosition, StockMovement
 
 
 @admin.register(Stock)
@@ -16,3 +16,8 @@ class StockPositionAdmin(admin.ModelAdmin):
         "average_supply_time",
         "stock",
     ]
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ["created", "stock", "product", "quantity", "note"]
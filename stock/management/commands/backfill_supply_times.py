@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from notes.models import NotePosition
+from stock.models import StockPosition
+from stock.services import smoothed_supply_time, supply_time_sample
+
+
+class Command(BaseCommand):
+    help = (
+        "Calculates average_supply_time of StockPositions "
+        "from the history of order and supply Notes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, chunk_size, **options):
+        averages = self.replay_notes(chunk_size)
+        updated = self.update_positions(averages, chunk_size)
+        self.stdout.write(f"Updated average supply time of {updated} positions.")
+
+    @staticmethod
+    def replay_notes(chunk_size):
+        """
+        Streams positions of order and supply Notes in order of creation
+        and returns average supply time of every stock and product.
+        Only the first pending order and the average are kept in memory
+        for every stock and product.
+        """
+
+        positions = (
+            NotePosition.objects.filter(note__type__in=["order", "supply"])
+            .order_by("note__created", "id")
+            .values_list(
+                "note__type",
+                "note__created",
+                "product_id",
+                "note__to_store__stock_id",
+                "note__to_shop__stock_id",
+            )
+        )
+        ordered, averages = {}, {}
+        for (
+            note_type,
+            created,
+            product_id,
+            store_stock,
+            shop_stock,
+        ) in positions.iterator(chunk_size=chunk_size):
+            key = (store_stock or shop_stock, product_id)
+            if key[0] is None:
+                continue
+            if note_type == "order":
+                ordered.setdefault(key, created)
+            elif key in ordered:
+                sample = supply_time_sample(ordered.pop(key), created)
+                averages[key] = smoothed_supply_time(averages.get(key), sample)
+        return averages
+
+    @staticmethod
+    def update_positions(averages, chunk_size):
+        """
+        Writes calculated averages to StockPositions in chunks.
+        """
+
+        updated, chunk = 0, []
+        with transaction.atomic():
+            for position in StockPosition.objects.only(
+                "id", "stock_id", "product_id", "average_supply_time"
+            ).iterator(chunk_size=chunk_size):
+                key = (position.stock_id, position.product_id)
+                if key not in averages:
+                    continue
+                position.average_supply_time = averages[key]
+                chunk.append(position)
+                if len(chunk) == chunk_size:
+                    StockPosition.objects.bulk_update(chunk, ["average_supply_time"])
+                    updated += len(chunk)
+                    chunk = []
+            StockPosition.objects.bulk_update(chunk, ["average_supply_time"])
+        return updated + len(chunk)
@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from notes.models import NotePosition
+from stock.models import StockMovement, StockPosition
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the stock movement ledger by replaying all Notes "
+        "and recalculates quantity of StockPositions from it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, chunk_size, **options):
+        with transaction.atomic():
+            StockMovement.objects.all().delete()
+            replayed = self.replay_notes(chunk_size)
+            self.update_positions(chunk_size)
+        self.stdout.write(f"Replayed {replayed} stock movements.")
+
+    @staticmethod
+    def replay_notes(chunk_size):
+        """
+        Writes movements of all NotePositions to the ledger in chunks.
+        """
+
+        positions = (
+            NotePosition.objects.exclude(note__type="order")
+            .order_by("id")
+            .values_list(
+                "note_id",
+                "product_id",
+                "quantity",
+                "note__from_store__stock_id",
+                "note__from_shop__stock_id",
+                "note__to_store__stock_id",
+                "note__to_shop__stock_id",
+            )
+        )
+        movements, replayed = [], 0
+        for (
+            note_id,
+            product_id,
+            quantity,
+            from_store_stock,
+            from_shop_stock,
+            to_store_stock,
+            to_shop_stock,
+        ) in positions.iterator(chunk_size=chunk_size):
+            for stock_id, sign in (
+                (from_store_stock or from_shop_stock, -1),
+                (to_store_stock or to_shop_stock, 1),
+            ):
+                if stock_id:
+                    movements.append(
+                        StockMovement(
+                            stock_id=stock_id,
+                            product_id=product_id,
+                            note_id=note_id,
+                            quantity=sign * quantity,
+                        )
+                    )
+            if len(movements) >= chunk_size:
+                StockMovement.objects.bulk_create(movements)
+                replayed += len(movements)
+                movements = []
+        StockMovement.objects.bulk_create(movements)
+        return replayed + len(movements)
+
+    @staticmethod
+    def update_positions(chunk_size):
+        """
+        Sets quantity of StockPositions to sums of their movements,
+        creating StockPositions for Products which have none yet.
+        """
+
+        movements = StockMovement.objects.filter(
+            stock=OuterRef("stock"), product=OuterRef("product")
+        ).values("stock", "product")
+        StockPosition.objects.update(
+            quantity=Coalesce(
+                Subquery(
+                    movements.annotate(total=Sum("quantity")).values("total"),
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ),
+                Value(0),
+            )
+        )
+        missing = (
+            StockMovement.objects.values("stock_id", "product_id")
+            .annotate(total=Sum("quantity"))
+            .filter(
+                ~Exists(
+                    StockPosition.objects.filter(
+                        stock=OuterRef("stock"), product=OuterRef("product")
+                    )
+                )
+            )
+            .order_by()
+        )
+        positions = []
+        for row in missing.iterator(chunk_size=chunk_size):
+            positions.append(
+                StockPosition(
+                    stock_id=row["stock_id"],
+                    product_id=row["product_id"],
+                    quantity=row["total"],
+                )
+            )
+            if len(positions) >= chunk_size:
+                StockPosition.objects.bulk_create(positions)
+                positions = []
+        StockPosition.objects.bulk_create(positions)
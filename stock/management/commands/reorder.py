@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from stock.reorder import PARAM_MINIMUMS, create_order_notes, suggest_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Suggests order quantities for StockPositions running out of stock "
+        "and optionally creates draft order Notes for suppliers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Number of recent days used to calculate dispatch velocity.",
+        )
+        parser.add_argument(
+            "--lead-time",
+            type=int,
+            default=7,
+            help="Lead time in days used when average_supply_time is not known.",
+        )
+        parser.add_argument(
+            "--review-period",
+            type=int,
+            default=7,
+            help="Number of days of dispatches an order should cover.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--create-notes",
+            action="store_true",
+            help="Create draft order Notes from suggestions.",
+        )
+
+    def handle(
+        self, *args, days, lead_time, review_period, chunk_size, create_notes, **options
+    ):
+        params = {"days": days, "lead_time": lead_time, "review_period": review_period}
+        for param, minimum in PARAM_MINIMUMS.items():
+            if params[param] < minimum:
+                option = param.replace("_", "-")
+                raise CommandError(f"--{option} must be at least {minimum}.")
+        suggestions = suggest_orders(days, lead_time, review_period, chunk_size)
+        for supplier, positions in suggestions.items():
+            self.stdout.write(f"Supplier {supplier}: {len(positions)} products")
+            for position in positions:
+                self.stdout.write(
+                    f"  stock {position['stock']} product {position['product']}: "
+                    f"order {position['order_quantity']}, "
+                    f"stock-out {position['stockout_date']}"
+                )
+        if create_notes:
+            with transaction.atomic():
+                notes = create_order_notes(suggestions)
+            self.stdout.write(f"Created {len(notes)} order notes.")
@@ -24,3 +24,41 @@ class StockPosition(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["stock", "product"], name="unique_stock_product"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["stock", "created", "id"]),
+            models.Index(fields=["product", "created", "id"]),
+        ]
+
+    def __str__(self):
+        return f"<StockPosition: {self.product_id} in {self.stock_id}>"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of changes of Product quantity in Stock,
+    written when positions are added to Notes. Changed and deleted
+    positions are reversed with movements of the opposite sign.
+    """
+
+    stock = models.ForeignKey(Stock, related_name="movements", on_delete=models.CASCADE)
+    product = models.ForeignKey(
+        Product, related_name="stock_movements", on_delete=models.CASCADE
+    )
+    note = models.ForeignKey(
+        "notes.Note", related_name="stock_movements", on_delete=models.CASCADE
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["stock", "product"])]
+
+    def __str__(self):
+        return f"<StockMovement: {self.id}>"
@@ -0,0 +1,189 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import ROUND_CEILING, Decimal
+
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Substr
+from django.utils import timezone
+from notes.models import Note, NotePosition
+from notes.services import ingest_note
+
+from .models import StockMovement, StockPosition
+
+DECIMAL = DecimalField(max_digits=20, decimal_places=4)
+
+# Smallest values of parameters of suggest_orders, velocity being
+# calculated over at least one day.
+PARAM_MINIMUMS = {"days": 1, "lead_time": 0, "review_period": 0}
+
+
+def reorder_candidates(first_id, last_id, days, lead_time):
+    """
+    Returns StockPositions with ids in given range which run out of stock
+    within their lead time or are below minimal_quantity.
+    Dispatch velocity, lead time and the reorder condition are calculated
+    by the database for the whole range in a single query.
+    Dispatched quantity is the net of all movements of dispatch Notes
+    created in the period out of the stock, so reversals of changed
+    and deleted positions cancel the movements they correct.
+    """
+
+    since = timezone.now() - timedelta(days=days)
+    dispatched = (
+        StockMovement.objects.filter(
+            Q(note__from_store__stock=OuterRef("stock"))
+            | Q(note__from_shop__stock=OuterRef("stock")),
+            stock=OuterRef("stock"),
+            product=OuterRef("product"),
+            note__type="dispatch",
+            note__created__gte=since,
+        )
+        .values("stock", "product")
+        .annotate(total=-Sum("quantity"))
+        .values("total")
+    )
+    supplier = (
+        NotePosition.objects.filter(
+            product=OuterRef("product"),
+            note__type="supply",
+            note__from_contractor__type="supplier",
+        )
+        .order_by("-note__created")
+        .values("note__from_contractor")[:1]
+    )
+    return (
+        StockPosition.objects.filter(id__gte=first_id, id__lte=last_id)
+        .annotate(
+            velocity=ExpressionWrapper(
+                Greatest(
+                    Coalesce(Subquery(dispatched, output_field=DECIMAL), Value(0)),
+                    Value(0),
+                )
+                / Value(float(days)),
+                output_field=DECIMAL,
+            ),
+            lead_time=Coalesce(
+                "average_supply_time", Value(float(lead_time)), output_field=DECIMAL
+            ),
+        )
+        .filter(
+            Q(velocity__gt=0, quantity__lte=F("velocity") * F("lead_time"))
+            | Q(quantity__lt=F("minimal_quantity"))
+        )
+        .annotate(supplier=Subquery(supplier))
+        .values(
+            "id",
+            "stock_id",
+            "stock__store",
+            "stock__shop",
+            "product_id",
+            "quantity",
+            "minimal_quantity",
+            "velocity",
+            "lead_time",
+            "supplier",
+        )
+        .order_by("id")
+    )
+
+
+def suggest_orders(days=30, lead_time=7, review_period=7, chunk_size=10000):
+    """
+    Scans all StockPositions in chunks and returns suggested order
+    quantities grouped by supplier Contractor. An order covers the
+    dispatch velocity for the lead time and the review period
+    on top of minimal_quantity.
+    """
+
+    today = timezone.now().date()
+    bounds = StockPosition.objects.aggregate(first=Min("id"), last=Max("id"))
+    suggestions = defaultdict(list)
+    if bounds["first"] is None:
+        return suggestions
+    for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+        for row in reorder_candidates(start, start + chunk_size - 1, days, lead_time):
+            velocity = Decimal(row["velocity"]).quantize(Decimal("0.0001"))
+            target = velocity * (Decimal(row["lead_time"]) + review_period)
+            target += row["minimal_quantity"] or 0
+            quantity = (target - row["quantity"]).quantize(
+                Decimal(1), rounding=ROUND_CEILING
+            )
+            if quantity <= 0:
+                continue
+            stockout_date = (
+                today + timedelta(days=int(max(row["quantity"], 0) / velocity))
+                if velocity
+                else None
+            )
+            suggestions[row["supplier"]].append(
+                {
+                    "stock": row["stock_id"],
+                    "store": row["stock__store"],
+                    "shop": row["stock__shop"],
+                    "product": row["product_id"],
+                    "quantity": row["quantity"],
+                    "velocity": velocity,
+                    "lead_time": Decimal(row["lead_time"]),
+                    "stockout_date": stockout_date,
+                    "order_quantity": quantity,
+                }
+            )
+    return suggestions
+
+
+def create_order_notes(suggestions):
+    """
+    Creates draft order Notes from suggestions, one for every supplier
+    and ordering location. Suggestions without a known supplier are skipped.
+    Numbers follow the highest number of the day, read in the transaction
+    creating the Notes, so they are unique after deletes as well.
+    """
+
+    prefix = f"ORD-{timezone.now():%y%m%d}-"
+    number = (
+        Note.objects.filter(number__regex=rf"^{prefix}[0-9]+$").aggregate(
+            last=Max(Cast(Substr("number", len(prefix) + 1), IntegerField()))
+        )["last"]
+        or 0
+    )
+    notes = []
+    for supplier, positions in suggestions.items():
+        if supplier is None:
+            continue
+        locations = defaultdict(list)
+        for position in positions:
+            locations[position["store"], position["shop"]].append(position)
+        for (store, shop), positions in locations.items():
+            number += 1
+            notes.append(
+                ingest_note(
+                    {
+                        "type": "order",
+                        "handover_type": "external",
+                        "number": f"{prefix}{number}",
+                        "from_contractor_id": supplier,
+                        "to_store_id": store,
+                        "to_shop_id": shop,
+                        "positions": [
+                            {
+                                "product_id": position["product"],
+                                "quantity": position["order_quantity"],
+                            }
+                            for position in positions
+                        ],
+                    }
+                )
+            )
+    return notes
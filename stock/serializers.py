@@ -0,0 +1,41 @@
+from products.models import Product
+from rest_framework import serializers
+
+from .models import StockPosition
+
+
+class ProductSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(source="category.name", read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ["id", "code", "name", "unit", "category"]
+
+
+class StockPositionSerializer(serializers.ModelSerializer):
+    product = ProductSerializer(read_only=True)
+    store = serializers.SerializerMethodField()
+    shop = serializers.SerializerMethodField()
+
+    class Meta:
+        model = StockPosition
+        fields = [
+            "stock",
+            "store",
+            "shop",
+            "product",
+            "quantity",
+            "minimal_quantity",
+            "average_supply_time",
+            "updated",
+        ]
+
+    @staticmethod
+    def get_store(position):
+        store = getattr(position.stock, "store", None)
+        return store.id if store else None
+
+    @staticmethod
+    def get_shop(position):
+        shop = getattr(position.stock, "shop", None)
+        return shop.id if shop else None
@@ -0,0 +1,143 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Min, Q, Value, When
+from notes.models import NotePosition
+
+from .models import StockMovement, StockPosition
+
+
+def record_movements(note, positions, sign=1):
+    """
+    Appends movements of given positions of the Note to the ledger
+    and applies them to StockPositions. A negative sign reverses
+    movements of previous values of the positions.
+    """
+
+    movements = [
+        StockMovement(
+            stock_id=stock_id,
+            product_id=position.product_id,
+            note_id=note.pk,
+            quantity=sign * direction * Decimal(position.quantity),
+        )
+        for stock_id, direction in note.stock_changes()
+        for position in positions
+    ]
+    if not movements:
+        return
+    with transaction.atomic():
+        StockMovement.objects.bulk_create(movements)
+        apply_movements(movements)
+
+
+def apply_movements(movements):
+    """
+    Changes quantity of StockPositions by given movements with atomic
+    updates, creating StockPositions which do not exist yet.
+    """
+
+    changes = defaultdict(Decimal)
+    for movement in movements:
+        changes[movement.stock_id, movement.product_id] += movement.quantity
+    for (stock_id, product_id), quantity in changes.items():
+        positions = StockPosition.objects.filter(
+            stock_id=stock_id, product_id=product_id
+        )
+        if positions.update(quantity=F("quantity") + quantity):
+            continue
+        try:
+            with transaction.atomic():
+                StockPosition.objects.create(
+                    stock_id=stock_id, product_id=product_id, quantity=quantity
+                )
+        except IntegrityError:
+            positions.update(quantity=F("quantity") + quantity)
+
+
+def supply_time_sample(ordered, supplied):
+    """
+    Returns time between an order and its supply in days.
+    """
+
+    days = Decimal((supplied - ordered).total_seconds()) / 86400
+    return days.quantize(Decimal("0.01"))
+
+
+def smoothed_supply_time(average, sample):
+    """
+    Returns the exponentially weighted average of supply time
+    updated with a new sample.
+    """
+
+    if average is None:
+        return sample
+    alpha = Decimal(str(settings.SUPPLY_TIME_SMOOTHING))
+    return (average + alpha * (sample - average)).quantize(Decimal("0.01"))
+
+
+def record_supply_times(note, positions):
+    """
+    Updates average_supply_time of StockPositions supplied by the Note.
+    Supply time is measured from the first order of the Product
+    to the same location placed since its previous supply. Products
+    already delivered by other positions of the Note are skipped,
+    so every supply is counted once.
+    """
+
+    if note.type != "supply":
+        return
+    supplied = [stock_id for stock_id, sign in note.stock_changes() if sign > 0]
+    if not supplied:
+        return
+    stock_id = supplied[0]
+    posted = Counter(position.product_id for position in positions)
+    saved = (
+        NotePosition.objects.filter(note=note, product_id__in=posted)
+        .values("product_id")
+        .annotate(count=Count("id"))
+        .values_list("product_id", "count")
+    )
+    product_ids = set(posted).difference(
+        product_id for product_id, count in saved if count > posted[product_id]
+    )
+    if not product_ids:
+        return
+    previous_supplies = dict(
+        StockMovement.objects.filter(
+            stock_id=stock_id,
+            product_id__in=product_ids,
+            note__type="supply",
+            note__created__lt=note.created,
+        )
+        .exclude(note=note)
+        .values("product_id")
+        .annotate(last=Max("note__created"))
+        .values_list("product_id", "last")
+    )
+    orders = NotePosition.objects.filter(
+        Q(note__to_store__stock=stock_id) | Q(note__to_shop__stock=stock_id),
+        note__type="order",
+        note__created__lte=note.created,
+    )
+    alpha = Decimal(str(settings.SUPPLY_TIME_SMOOTHING))
+    for product_id in product_ids:
+        product_orders = orders.filter(product_id=product_id)
+        if product_id in previous_supplies:
+            product_orders = product_orders.filter(
+                note__created__gt=previous_supplies[product_id]
+            )
+        ordered = product_orders.aggregate(first=Min("note__created"))["first"]
+        if ordered is None:
+            continue
+        sample = supply_time_sample(ordered, note.created)
+        StockPosition.objects.filter(stock_id=stock_id, product_id=product_id).update(
+            average_supply_time=Case(
+                When(average_supply_time__isnull=True, then=Value(sample)),
+                default=F("average_supply_time")
+                + alpha * (Value(sample) - F("average_supply_time")),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from notes.models import Note
+from notes.signals import positions_posted, positions_reversed
+
+from .models import StockMovement
+from .services import record_movements, record_supply_times
+
+
+@receiver(positions_posted)
+def record_note_movements(sender, note, positions, **kwargs):
+    record_movements(note, positions)
+
+
+@receiver(positions_reversed)
+def reverse_note_movements(sender, note, positions, **kwargs):
+    record_movements(note, positions, sign=-1)
+
+
+@receiver(post_delete, sender=Note)
+def delete_note_movements(sender, instance, **kwargs):
+    """
+    Deletes reversing movements written while positions of a deleted Note
+    were deleted, its other movements being deleted with it.
+    """
+
+    StockMovement.objects.filter(note_id=instance.pk).delete()
+
+
+@receiver(positions_posted)
+def update_supply_times(sender, note, positions, reposted=False, **kwargs):
+    # Changes of positions or their Note are not new supplies.
+    if not reposted:
+        record_supply_times(note, positions)
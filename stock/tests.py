@@ -1,3 +1,292 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from notes.models import Note, NotePosition
+from stock.models import StockMovement, StockPosition
+from stock.reorder import create_order_notes, suggest_orders
+
+
+def stock_quantities():
+    return {
+        (position.stock_id, position.product_id): position.quantity
+        for position in StockPosition.objects.all()
+    }
+
+
+@pytest.mark.django_db
+class TestStockLedger:
+    @staticmethod
+    def test_stock_positions_of_test_data():
+        quantities = stock_quantities()
+        assert quantities[1, 1] == Decimal("500.00")
+        assert quantities[1, 4] == Decimal("500.00")
+        assert quantities[4, 1] == Decimal("498.00")
+        assert quantities[4, 2] == Decimal("495.00")
+        assert quantities[4, 3] == Decimal("500.00")
+        assert StockMovement.objects.filter(note__number="EXT-DIS-1").count() == 2
+
+    @staticmethod
+    def test_order_does_not_change_stock():
+        note = Note(type="order", handover_type="external", number="EXT-ORD-1")
+        note.from_contractor_id, note.to_store_id = 2, 1
+        note.save()
+        NotePosition(note=note, product_id=1, quantity=100).save()
+        assert stock_quantities()[1, 1] == Decimal("500.00")
+        assert not StockMovement.objects.filter(note=note).exists()
+
+    @staticmethod
+    def assert_ledger_consistent():
+        quantities = stock_quantities()
+        call_command("rebuild_stock", stdout=StringIO())
+        assert stock_quantities() == quantities
+
+    def test_update_position(self):
+        position = NotePosition.objects.get(note__number="EXT-DIS-1", product_id=1)
+        position.quantity = 5
+        position.save()
+        assert stock_quantities()[4, 1] == Decimal("495.00")
+        position.product_id = 3
+        position.save()
+        assert stock_quantities()[4, 1] == Decimal("500.00")
+        assert stock_quantities()[4, 3] == Decimal("495.00")
+        self.assert_ledger_consistent()
+
+    def test_delete_position(self):
+        NotePosition.objects.get(note__number="EXT-DIS-1", product_id=2).delete()
+        assert stock_quantities()[4, 2] == Decimal("500.00")
+        self.assert_ledger_consistent()
+
+    def test_update_note(self):
+        note = Note.objects.get(number="EXT-DIS-1")
+        note.from_shop, note.from_store_id = None, 1
+        note.save()
+        quantities = stock_quantities()
+        assert quantities[4, 1] == quantities[1, 1] + 2 == Decimal("500.00")
+        self.assert_ledger_consistent()
+
+    def test_delete_note(self):
+        Note.objects.get(number="EXT-DIS-1").delete()
+        assert stock_quantities()[4, 1] == stock_quantities()[4, 2] == 500
+        assert not StockMovement.objects.filter(note__number="EXT-DIS-1").exists()
+        self.assert_ledger_consistent()
+
+    @staticmethod
+    def test_rebuild_stock():
+        quantities = stock_quantities()
+        movements = StockMovement.objects.count()
+        StockPosition.objects.filter(stock_id=1).update(quantity=0)
+        StockPosition.objects.filter(stock_id=4, product_id=1).delete()
+        out = StringIO()
+        call_command("rebuild_stock", "--chunk-size=3", stdout=out)
+        assert out.getvalue() == f"Replayed {movements} stock movements.\n"
+        assert stock_quantities() == quantities
+
+
+@pytest.mark.django_db
+class TestViews:
+    @staticmethod
+    def test_position_list_view(client, assert_query_budget):
+        response = assert_query_budget(client, "/stock/", 2)
+        assert len(response.data["results"]) == 8
+        response = client.get("/stock/?code=XYZ123")
+        assert [row["stock"] for row in response.data["results"]] == [1, 4]
+
+    @staticmethod
+    def test_location_views(client):
+        response = client.get("/stock/stores/1/")
+        assert {row["store"] for row in response.data["results"]} == {1}
+        response = client.get("/stock/shops/1/?category=1")
+        results = response.data["results"]
+        assert {row["shop"] for row in results} == {1}
+        assert results[0]["product"]["category"] == "Grocery"
+        assert results[0]["quantity"] == "498.00"
+        response = client.get("/stock/stocks/4/")
+        assert len(response.data["results"]) == 4
+
+    @staticmethod
+    def test_product_views(client):
+        response = client.get("/stock/products/2/")
+        assert [row["quantity"] for row in response.data["results"]] == [
+            "500.00",
+            "495.00",
+        ]
+        response = client.get("/stock/products/2/total/")
+        assert response.data["quantity"] == Decimal("995.00")
+        assert response.data["locations"] == 2
+
+    @staticmethod
+    def test_below_minimal_view(client):
+        StockPosition.objects.filter(stock_id=4, product_id=2).update(
+            minimal_quantity=600
+        )
+        response = client.get("/stock/below_minimal/")
+        assert [
+            (row["stock"], row["product"]["id"]) for row in response.data["results"]
+        ] == [(4, 2)]
+        response = client.get("/stock/?below_minimal=true")
+        assert [row["stock"] for row in response.data["results"]] == [4]
+        response = client.get("/stock/?below_minimal=false")
+        assert len(response.data["results"]) > 1
+        response = client.get("/stock/?below_minimal=0")
+        assert len(response.data["results"]) > 1
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "query", ["category=abc", "below_minimal=maybe", "category=1.5"]
+    )
+    def test_invalid_filters(client, query):
+        response = client.get(f"/stock/?{query}")
+        assert response.status_code == 400
+        assert list(response.data) == [query.partition("=")[0]]
+
+
+@pytest.mark.django_db
+class TestReorder:
+    @staticmethod
+    @pytest.fixture
+    def dispatches():
+        """Dispatches 450 pc. of Black Tea from Shop-Warsaw-01."""
+
+        note = Note(type="dispatch", handover_type="external", number="EXT-DIS-2")
+        note.from_shop_id, note.to_contractor_id = 1, 1
+        note.save()
+        NotePosition(note=note, product_id=1, quantity=450).save()
+        StockPosition.objects.filter(stock_id=4, product_id=2).update(
+            minimal_quantity=600
+        )
+
+    @staticmethod
+    def test_suggest_orders(dispatches):
+        suggestions = suggest_orders(days=30, lead_time=7, chunk_size=3)
+        assert list(suggestions) == [2]
+        black_tea, red_tea = suggestions[2]
+        assert (black_tea["stock"], black_tea["product"]) == (4, 1)
+        assert black_tea["velocity"] == Decimal("15.0667")
+        assert black_tea["order_quantity"] == Decimal("163")
+        assert black_tea["stockout_date"] == date.today() + timedelta(days=3)
+        assert (red_tea["stock"], red_tea["product"]) == (4, 2)
+        assert red_tea["order_quantity"] == Decimal("108")
+
+    @staticmethod
+    def velocities():
+        """Returns suggested products of Shop-Warsaw-01 with their velocity."""
+
+        return [
+            (position["product"], position["velocity"])
+            for position in suggest_orders(days=30, lead_time=7)[2]
+        ]
+
+    def test_suggest_orders_after_changed_dispatch(self, dispatches):
+        position = NotePosition.objects.get(note__number="EXT-DIS-2")
+        position.quantity = 10
+        position.save()
+        assert self.velocities() == [(2, Decimal("0.1667"))]
+        # Kept below minimal_quantity to be suggested with its velocity.
+        StockPosition.objects.filter(stock_id=4, product_id=1).update(
+            minimal_quantity=1000
+        )
+        assert self.velocities() == [(1, Decimal("0.4000")), (2, Decimal("0.1667"))]
+
+    def test_suggest_orders_after_deleted_dispatch(self, dispatches):
+        NotePosition.objects.get(note__number="EXT-DIS-2").delete()
+        assert self.velocities() == [(2, Decimal("0.1667"))]
+        StockPosition.objects.filter(stock_id=4, product_id=1).update(
+            minimal_quantity=1000
+        )
+        assert self.velocities() == [(1, Decimal("0.0667")), (2, Decimal("0.1667"))]
+
+    @staticmethod
+    def test_reorder_views(dispatches, client, worker_1):
+        response = client.get("/stock/reorder/?days=30")
+        assert response.data[0]["supplier"] == 2
+        assert len(response.data[0]["positions"]) == 2
+
+        response = worker_1.post("/stock/reorder/create/")
+        number = response.data["created"][0]
+        note = Note.objects.get(number=number)
+        assert (note.type, note.from_contractor_id, note.to_shop_id) == ("order", 2, 1)
+        assert list(note.positions.values_list("product_id", "quantity")) == [
+            (1, Decimal("163.00")),
+            (2, Decimal("108.00")),
+        ]
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "query", ["days=0", "days=-1", "lead_time=-1", "review_period=-7", "days=x"]
+    )
+    def test_reorder_invalid_params(client, query):
+        response = client.get(f"/stock/reorder/?{query}")
+        assert response.status_code == 400
+        assert list(response.data) == [query.partition("=")[0]]
+
+    @staticmethod
+    def test_order_note_numbers(dispatches):
+        suggestions = suggest_orders()
+        prefix = f"ORD-{timezone.now():%y%m%d}-"
+        first = create_order_notes(suggestions)[0]
+        assert first.number == f"{prefix}1"
+        assert create_order_notes(suggestions)[0].number == f"{prefix}2"
+        first.delete()
+        assert create_order_notes(suggestions)[0].number == f"{prefix}3"
+
+    @staticmethod
+    def test_reorder_command(dispatches):
+        out = StringIO()
+        call_command("reorder", "--create-notes", stdout=out)
+        assert "Supplier 2: 2 products" in out.getvalue()
+        assert "Created 1 order notes." in out.getvalue()
+        assert Note.objects.filter(type="order").count() == 1
+
+        with pytest.raises(CommandError, match="--days must be at least 1"):
+            call_command("reorder", "--days=0")
+
+
+def create_note(note_type, number, days_ago, quantity=10):
+    note = Note(type=note_type, handover_type="external", number=number)
+    note.from_contractor_id, note.to_store_id = 2, 1
+    note.save()
+    Note.objects.filter(pk=note.pk).update(
+        created=timezone.now() - timedelta(days=days_ago)
+    )
+    note.refresh_from_db()
+    NotePosition(note=note, product_id=1, quantity=quantity).save()
+    return note
+
+
+@pytest.mark.django_db
+class TestSupplyTime:
+    @staticmethod
+    def supply_time():
+        return StockPosition.objects.get(stock_id=1, product_id=1).average_supply_time
+
+    def test_average_supply_time(self):
+        Note.objects.filter(number="EXT-SUP-1").update(
+            created=timezone.now() - timedelta(days=30)
+        )
+        create_note("order", "EXT-ORD-1", days_ago=10)
+        create_note("order", "EXT-ORD-2", days_ago=8)
+        create_note("supply", "EXT-SUP-2", days_ago=5)
+        assert self.supply_time() == Decimal("5.00")
+        create_note("supply", "EXT-SUP-3", days_ago=4)
+        assert self.supply_time() == Decimal("5.00")
+        create_note("order", "EXT-ORD-3", days_ago=3)
+        create_note("supply", "EXT-SUP-4", days_ago=0)
+        assert self.supply_time() == Decimal("4.40")
+
+    def test_supply_with_repeated_product(self):
+        self.test_average_supply_time()
+        note = Note.objects.get(number="EXT-SUP-4")
+        NotePosition(note=note, product_id=1, quantity=5).save()
+        assert self.supply_time() == Decimal("4.40")
+
+    def test_backfill_supply_times(self):
+        self.test_average_supply_time()
+        StockPosition.objects.update(average_supply_time=None)
+        out = StringIO()
+        call_command("backfill_supply_times", "--chunk-size=2", stdout=out)
+        assert out.getvalue() == "Updated average supply time of 1 positions.\n"
+        assert self.supply_time() == Decimal("4.40")
@@ -0,0 +1,41 @@
+from django.urls import path
+
+from . import views
+
+app_name = "stock"
+
+urlpatterns = [
+    path("", views.StockPositionListView.as_view(), name="position_list"),
+    path(
+        "below_minimal/",
+        views.StockPositionListView.as_view(below_minimal=True),
+        name="below_minimal_list",
+    ),
+    path(
+        "stocks/<int:stock_id>/",
+        views.StockPositionListView.as_view(),
+        name="stock_position_list",
+    ),
+    path(
+        "stores/<int:store_id>/",
+        views.StockPositionListView.as_view(),
+        name="store_position_list",
+    ),
+    path(
+        "shops/<int:shop_id>/",
+        views.StockPositionListView.as_view(),
+        name="shop_position_list",
+    ),
+    path(
+        "products/<int:product_id>/",
+        views.StockPositionListView.as_view(),
+        name="product_position_list",
+    ),
+    path("reorder/", views.ReorderView.as_view(), name="reorder"),
+    path("reorder/create/", views.ReorderCreateView.as_view(), name="reorder_create"),
+    path(
+        "products/<int:product_id>/total/",
+        views.ProductStockView.as_view(),
+        name="product_total",
+    ),
+]
@@ -1,3 +1,131 @@
-from django.shortcuts import render
+from accounts.authentication import (
+    CachedBasicAuthentication,
+    CachedTokenAuthentication,
+)
+from bills.permissions import IsWorker
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.shortcuts import get_object_or_404
+from products.models import Product
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .models import StockPosition
+from .reorder import PARAM_MINIMUMS, create_order_notes, suggest_orders
+from .serializers import StockPositionSerializer
+
+
+class StockPositionListView(generics.ListAPIView):
+    """
+    Lists StockPositions, optionally of given stock, store, shop or product.
+    Positions can be filtered with 'code' and 'category' of the Product,
+    and with 'below_minimal' to get only those below minimal_quantity.
+    """
+
+    serializer_class = StockPositionSerializer
+    below_minimal = False
+
+    def get_queryset(self):
+        params = self.request.query_params
+        category = params.get("category")
+        if category is not None:
+            try:
+                category = int(category)
+            except ValueError:
+                raise ValidationError({"category": "A valid integer is required."})
+        below_minimal = params.get("below_minimal", False)
+        if below_minimal in BooleanField.TRUE_VALUES:
+            below_minimal = True
+        elif below_minimal in BooleanField.FALSE_VALUES:
+            below_minimal = False
+        else:
+            raise ValidationError({"below_minimal": "Must be a valid boolean."})
+        positions = StockPosition.objects.select_related(
+            "product__category", "stock__store", "stock__shop"
+        )
+        filters = {
+            "stock_id": self.kwargs.get("stock_id"),
+            "stock__store": self.kwargs.get("store_id"),
+            "stock__shop": self.kwargs.get("shop_id"),
+            "product_id": self.kwargs.get("product_id"),
+            "product__code": params.get("code"),
+            "product__category_id": category,
+        }
+        positions = positions.filter(
+            **{key: value for key, value in filters.items() if value is not None}
+        )
+        if self.below_minimal or below_minimal:
+            positions = positions.filter(quantity__lt=F("minimal_quantity"))
+        return positions
+
+
+class ProductStockView(APIView):
+    """
+    Returns total quantity of the Product in all locations.
+    """
+
+    def get(self, request, product_id):
+        product = get_object_or_404(Product, pk=product_id)
+        totals = StockPosition.objects.filter(product=product).aggregate(
+            quantity=Sum("quantity"), locations=Count("id")
+        )
+        return Response(
+            {
+                "product": product.id,
+                "code": product.code,
+                "quantity": totals["quantity"] or 0,
+                "locations": totals["locations"],
+            }
+        )
+
+
+def reorder_params(request):
+    """
+    Returns parameters of suggest_orders given in the query string.
+    """
+
+    params = {}
+    for param, minimum in PARAM_MINIMUMS.items():
+        if param in request.query_params:
+            try:
+                params[param] = int(request.query_params[param])
+            except ValueError:
+                raise ValidationError({param: "A valid integer is required."})
+            if params[param] < minimum:
+                raise ValidationError(
+                    {param: f"Ensure this value is greater than or equal to {minimum}."}
+                )
+    return params
+
+
+class ReorderView(APIView):
+    """
+    Returns suggested orders grouped by supplier.
+    """
+
+    def get(self, request):
+        suggestions = suggest_orders(**reorder_params(request))
+        return Response(
+            [
+                {"supplier": supplier, "positions": positions}
+                for supplier, positions in suggestions.items()
+            ]
+        )
+
+
+class ReorderCreateView(APIView):
+    """
+    Creates draft order Notes from suggested orders.
+    """
+
+    authentication_classes = (CachedTokenAuthentication, CachedBasicAuthentication)
+    permission_classes = (IsWorker,)
+
+    def post(self, request):
+        suggestions = suggest_orders(**reorder_params(request))
+        with transaction.atomic():
+            notes = create_order_notes(suggestions)
+        return Response({"created": [note.number for note in notes]})
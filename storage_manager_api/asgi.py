@@ -2,6 +2,7 @@
 ASGI config for storage_manager_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Read views of bills are served by async views, see bills/async_views.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -9,8 +10,12 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "storage_manager_api.settings")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from storage_manager_api.handlers import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -0,0 +1,17 @@
+"""
+URL configuration of the ASGI application: storage_manager_api.urls
+with async read views of bills.
+"""
+
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [
+    (
+        path("bills/", include("bills.async_urls", namespace="api"))
+        if str(pattern.pattern) == "bills/"
+        else pattern
+    )
+    for pattern in urls.urlpatterns
+]
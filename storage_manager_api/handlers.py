@@ -0,0 +1,118 @@
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.handlers import asgi
+from django.http import StreamingHttpResponse
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of middleware running in the mode of the handler it wraps,
+    so under ASGI requests are not handed over to a thread.
+    Subclasses implement handle() and the coroutine ahandle().
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Makes Django await the middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    StreamingHttpResponse with content produced by an async iterator.
+    ASGIHandler sends it without holding a thread, WSGI servers iterate
+    it with async_to_sync().
+    """
+
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        return self.map_bytes(self._iterator)
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._iterator = value.__aiter__()
+
+    async def map_bytes(self, chunks):
+        async for chunk in chunks:
+            yield self.make_bytes(chunk)
+
+    def __iter__(self):
+        next_chunk = async_to_sync(self.streaming_content.__anext__)
+        while True:
+            try:
+                yield next_chunk()
+            except StopAsyncIteration:
+                return
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """
+    Routes requests with ASGI_URLCONF, which serves async read views.
+    Async streamed content is sent from the event loop, sync streamed
+    content is produced on the thread of sync views, like the views
+    which returned it, instead of blocking the event loop.
+    """
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASGI_URLCONF
+        return request, error_response
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        async for part in self.parts(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+    @staticmethod
+    async def parts(response):
+        if getattr(response, "is_async", False):
+            async for part in response.streaming_content:
+                yield part
+            return
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                return
+            yield part
@@ -0,0 +1,80 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection
+from notes.models import Note, NotePosition
+from notes.services import load_notes
+
+
+def bulk_load(data, chunk_size=5000):
+    """
+    Loads rows given as {Model: [field values]} with bulk inserts,
+    in the order of the models. Notes are loaded with their positions,
+    so their totals and stock are the same as when positions are saved
+    one by one.
+    """
+
+    positions = defaultdict(list)
+    for row in data.get(NotePosition, []):
+        positions[row["note_id"]].append(NotePosition(**row))
+    for model, rows in data.items():
+        if model is Note:
+            notes = [Note(**row) for row in rows]
+            load_notes(
+                ((note, positions[note.id]) for note in notes), chunk_size=chunk_size
+            )
+        elif model is not NotePosition:
+            model.objects.bulk_create(
+                [model(**row) for row in rows], batch_size=chunk_size
+            )
+
+
+def insert_rows(model, fields, rows, chunk_size=5000):
+    """
+    Inserts tuples of values of the given fields, prepared for the database,
+    with one executemany() call per chunk. Model instances, save() and
+    signals are skipped, so it is meant for generated data only.
+    Returns the number of inserted rows.
+    """
+
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(field).column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    )
+    rows, inserted = iter(rows), 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return inserted
+            cursor.executemany(sql, chunk)
+            inserted += len(chunk)
+
+
+@contextmanager
+def indexes_deferred(*models):
+    """
+    Drops secondary indexes of the models' tables and recreates them
+    on exit, so rows are loaded without updating the indexes row by row.
+    Uses the definitions of indexes stored by SQLite.
+    """
+
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            f"AND sql IS NOT NULL AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+            tables,
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
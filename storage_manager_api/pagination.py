@@ -0,0 +1,98 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates querysets by (created, id) with an opaque cursor.
+    Pages are fetched with a range condition on the ordering columns
+    instead of OFFSET, so every page costs the same to retrieve.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        page, self.next_cursor = self.paginate(
+            queryset, cursor, self.get_page_size(request)
+        )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict([("next", self.get_next_link()), ("results", data)])
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    @staticmethod
+    def paginate(queryset, cursor, page_size):
+        """
+        Returns objects following the cursor position
+        and the cursor of the next page, if there is one.
+        """
+
+        queryset = queryset.order_by("created", "id")
+        if cursor:
+            created, pk = cursor
+            queryset = queryset.filter(created__gte=created).filter(
+                Q(created__gt=created) | Q(id__gt=pk)
+            )
+        page = list(queryset[: page_size + 1])
+        if len(page) <= page_size:
+            return page, None
+        page = page[:page_size]
+        last = page[-1]
+        return page, KeysetPagination.encode_cursor(last.created, last.id)
+
+    @staticmethod
+    def encode_cursor(created, pk):
+        position = json.dumps([created.isoformat(), pk]).encode()
+        return urlsafe_b64encode(position).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            created, pk = json.loads(urlsafe_b64decode(encoded.encode()))
+            created = parse_datetime(created)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
@@ -0,0 +1,28 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS,
+    thread_name_prefix="db",
+)
+
+
+def call(function, args):
+    close_old_connections()
+    return function(*args)
+
+
+async def run_in_pool(function, *args):
+    """
+    Runs blocking ORM work of async views in the bounded database
+    thread pool, in a copy of the current context, so the router
+    and the monitoring see the request the work is done for.
+    """
+
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, context.run, call, function, args)
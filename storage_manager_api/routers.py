@@ -0,0 +1,147 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .handlers import AsyncCapableMiddleware
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+read_database = ContextVar("read_database", default=None)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of safe requests to the read replica chosen
+    by ReplicaMiddleware. Writes, reads inside transactions and reads
+    outside of requests, e.g. in management commands, use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        if alias and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+# Signed cookie pinning clients to the primary after their writes.
+PIN_COOKIE = "replica_pin"
+PIN_SALT = "storage_manager_api.routers.pin"
+
+
+class ReplicaMiddleware(AsyncCapableMiddleware):
+    """
+    Routes reads of safe requests to a random read replica.
+    After an unsafe request the client is pinned to the primary
+    for REPLICA_PIN_SECONDS, so it reads its own writes
+    while replicas catch up. The pin is a signed cookie carried
+    by the client, so it holds across worker processes.
+    """
+
+    @staticmethod
+    def replica(request):
+        """Returns the replica for reads of the request, if any."""
+
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS:
+            return None
+        pinned = request.get_signed_cookie(
+            PIN_COOKIE,
+            default=None,
+            salt=PIN_SALT,
+            max_age=settings.REPLICA_PIN_SECONDS,
+        )
+        if pinned:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    @staticmethod
+    def pin(request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_signed_cookie(
+                PIN_COOKIE,
+                "1",
+                salt=PIN_SALT,
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+
+    def handle(self, request):
+        alias = self.replica(request)
+        if alias is None:
+            response = self.get_response(request)
+            self.pin(request, response)
+            return response
+        token = read_database.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.read_response_from(alias, response)
+
+    async def ahandle(self, request):
+        alias = self.replica(request)
+        if alias is None:
+            response = await self.get_response(request)
+            self.pin(request, response)
+            return response
+        token = read_database.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.read_response_from(alias, response)
+
+    def read_response_from(self, alias, response):
+        if getattr(response, "is_async", False):
+            response.streaming_content = self.aread_from(
+                alias, response.streaming_content
+            )
+        elif response.streaming:
+            response.streaming_content = self.read_from(
+                alias, response.streaming_content
+            )
+        return response
+
+    @staticmethod
+    def read_from(alias, chunks):
+        """
+        Keeps reads of streamed content on the replica of the request,
+        as the content is produced after the middleware returns.
+        """
+
+        chunks = iter(chunks)
+        while True:
+            token = read_database.set(alias)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                read_database.reset(token)
+            yield chunk
+
+    @staticmethod
+    async def aread_from(alias, chunks):
+        """Async version of read_from()."""
+
+        while True:
+            token = read_database.set(alias)
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                read_database.reset(token)
+            yield chunk
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,11 +45,17 @@ INSTALLED_APPS = [
     "bills.apps.BillsConfig",
     "workers.apps.WorkersConfig",
     "stock.apps.StockConfig",
+    "reports.apps.ReportsConfig",
+    "monitoring.apps.MonitoringConfig",
     "rest_framework",
+    "rest_framework.authtoken",
 ]
 
 MIDDLEWARE = [
+    "monitoring.middleware.MetricsMiddleware",
+    "monitoring.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "storage_manager_api.routers.ReplicaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -59,6 +66,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "storage_manager_api.urls"
 
+# Used by the ASGI application, serves async versions of read views
+ASGI_URLCONF = "storage_manager_api.asgi_urls"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -81,11 +91,64 @@ WSGI_APPLICATION = "storage_manager_api.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# SQLite profile for concurrent use: write-ahead log lets reads run during
+# writes, writers wait for the lock with busy_timeout and take it when
+# their transaction starts.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "storage_manager_api.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {
+            "timeout": 5,
+            "pragmas": SQLITE_PRAGMAS,
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+}
+
+# Read replicas receive reads of safe requests. A local replica is a copy
+# of the primary database file, enabled with STORAGE_REPLICA=1 and refreshed
+# with: sqlite3 db.sqlite3 ".backup replica.sqlite3"
+
+DATABASE_REPLICAS = []
+
+if os.environ.get("STORAGE_REPLICA"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / "replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
     }
+    DATABASE_REPLICAS.append("replica")
+
+DATABASE_ROUTERS = ["storage_manager_api.routers.ReplicaRouter"]
+
+# Seconds for which clients read from the primary after writing
+
+REPLICA_PIN_SECONDS = 5
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "auth": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auth",
+        "TIMEOUT": 300,
+    },
 }
 
 
@@ -128,7 +191,48 @@ USE_TZ = True
 STATIC_URL = "/static/"
 
 
-REST_FRAMEWORK = {"DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.AllowAny"]}
+REST_FRAMEWORK = {
+    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.AllowAny"],
+    "DEFAULT_PAGINATION_CLASS": "storage_manager_api.pagination.KeysetPagination",
+    "PAGE_SIZE": 100,
+}
 
 
 AUTH_USER_MODEL = "accounts.User"
+
+# Seconds for which authenticated Users with their Workers are cached
+
+AUTH_USER_CACHE_TIMEOUT = 60
+
+
+# Exports of bills data written in background
+
+EXPORT_ROOT = BASE_DIR / "exports"
+
+EXPORT_WORKERS = 2
+
+
+# Weight of the latest supply time in average_supply_time of StockPositions
+
+SUPPLY_TIME_SMOOTHING = 0.3
+
+
+# Queries slower than the threshold are logged with their plans,
+# None disables the log
+
+SLOW_QUERY_THRESHOLD_MS = 100
+
+SLOW_QUERY_LOG_SIZE = 1000
+
+
+# Requests sent with this token in the X-Profile header or the profile
+# query parameter are profiled, None disables profiling
+
+PROFILING_TOKEN = os.environ.get("STORAGE_PROFILING_TOKEN")
+
+PROFILE_ROOT = BASE_DIR / "profiles"
+
+
+# Threads running ORM work of async views under ASGI
+
+ASYNC_DB_THREADS = 8
@@ -0,0 +1,29 @@
+"""
+SQLite database backend applying a performance profile to new connections.
+
+Accepts two additional OPTIONS:
+    pragmas: mapping of PRAGMA names to values set on every new connection,
+    transaction_mode: 'DEFERRED', 'IMMEDIATE' or 'EXCLUSIVE' mode of
+        transactions started by atomic blocks.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop("pragmas", {})
+        self.transaction_mode = params.pop("transaction_mode", "DEFERRED")
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Writers taking the lock when the transaction starts wait for each
+        # other with busy_timeout, instead of failing with "database is
+        # locked" when a read transaction is upgraded to a write one.
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
@@ -13,10 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("accounts/", include("accounts.urls", namespace="accounts")),
     path("bills/", include("bills.urls", namespace="api")),
+    path("metrics/", include("monitoring.urls", namespace="monitoring")),
+    path("notes/", include("notes.urls", namespace="notes")),
+    path("reports/", include("reports.urls", namespace="reports")),
+    path("stock/", include("stock.urls", namespace="stock")),
 ]
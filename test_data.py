@@ -7,8 +7,12 @@ from stock.models import Stock
 from workers.models import Worker
 
 test_data = {
-    Manufacturer: [{"name": "Lipton"}, {"name": "Herbapol"}, {"name": "Tetley"}],
-    Category: [{"name": "Grocery"}],
+    Manufacturer: [
+        {"id": 1, "name": "Lipton"},
+        {"id": 2, "name": "Herbapol"},
+        {"id": 3, "name": "Tetley"},
+    ],
+    Category: [{"id": 1, "name": "Grocery"}],
     Product: [
         {
             "id": 1,
@@ -121,7 +125,7 @@ test_data = {
             "user_id": 2,
         },
     ],
-    Stock: [{}] * 7,
+    Stock: [{"id": i} for i in range(1, 8)],
     Store: [
         {
             "id": 1,
@@ -204,6 +208,7 @@ test_data = {
     ],
     Note: [
         {
+            "id": 1,
             "type": "supply",
             "handover_type": "external",
             "number": "EXT-SUP-1",
@@ -216,6 +221,7 @@ test_data = {
             "worker_id": 2,
         },
         {
+            "id": 2,
             "type": "dispatch",
             "handover_type": "internal",
             "number": "INT-DIS-1",
@@ -228,6 +234,7 @@ test_data = {
             "worker_id": 2,
         },
         {
+            "id": 3,
             "type": "dispatch",
             "handover_type": "external",
             "number": "EXT-DIS-1",